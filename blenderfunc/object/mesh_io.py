@@ -0,0 +1,279 @@
+import os
+import numpy as np
+
+# numpy dtypes of ply property types
+_PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'
+}
+
+# names of uv coordinates of ply vertices
+_PLY_UV_NAMES = [('s', 't'), ('u', 'v'), ('texture_u', 'texture_v'), ('texture_s', 'texture_t')]
+
+_STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+
+def _merge_vertices(points: np.ndarray) -> (np.ndarray, np.ndarray):
+    """merge duplicated points of triangle soup (N * 3, 3), return vertices and triangles"""
+    vertices, inverse = np.unique(points, axis=0, return_inverse=True)
+    return vertices, inverse.reshape(-1, 3)
+
+
+def _read_stl(filepath: str) -> (np.ndarray, np.ndarray):
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    if len(data) >= 84:
+        num_triangles = int(np.frombuffer(data, dtype='<u4', count=1, offset=80)[0])
+        if len(data) == 84 + num_triangles * _STL_DTYPE.itemsize:
+            triangles = np.frombuffer(data, dtype=_STL_DTYPE, count=num_triangles, offset=84)
+            return _merge_vertices(triangles['vertices'].reshape(-1, 3))
+    if not data.lstrip().startswith(b'solid'):
+        raise Exception('Invalid STL file: {}'.format(filepath))
+    lines = [line.split() for line in data.decode('ascii', errors='ignore').splitlines()]
+    points = np.array([line[1:4] for line in lines if len(line) == 4 and line[0] == 'vertex'], dtype=np.float32)
+    return _merge_vertices(points.reshape(-1, 3))
+
+
+def _parse_ply_header(f) -> (str, list):
+    """return the format and the elements of ply file, element: (name, count, properties), property: (name, dtype)
+    or (name, count dtype, item dtype) for list properties"""
+    if f.readline().strip() != b'ply':
+        raise Exception('Invalid PLY file: {}'.format(f.name))
+    ply_format = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise Exception('Invalid PLY header: {}'.format(f.name))
+        tokens = line.decode('ascii').split()
+        if len(tokens) == 0 or tokens[0] in ['comment', 'obj_info']:
+            continue
+        if tokens[0] == 'end_header':
+            return ply_format, elements
+        if tokens[0] == 'format':
+            ply_format = tokens[1]
+        elif tokens[0] == 'element':
+            elements.append((tokens[1], int(tokens[2]), []))
+        elif tokens[0] == 'property':
+            if tokens[1] == 'list':
+                elements[-1][2].append((tokens[4], _PLY_TYPES[tokens[2]], _PLY_TYPES[tokens[3]]))
+            else:
+                elements[-1][2].append((tokens[2], _PLY_TYPES[tokens[1]]))
+
+
+def _read_ply_binary_element(data: bytes, offset: int, count: int, properties: list, endian: str) -> (dict, int):
+    """read an element of binary ply, return property arrays and the offset of next element. Faces with the same
+    number of vertices are read with one structured dtype, others fall back to a python loop"""
+    if all(len(p) == 2 for p in properties):
+        dtype = np.dtype([(p[0], endian + p[1]) for p in properties])
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        return {p[0]: array[p[0]] for p in properties}, offset + count * dtype.itemsize
+    if count == 0:
+        return {p[0]: np.zeros(0) for p in properties}, offset
+
+    # guess the list length from the first element
+    fields = []
+    pos = offset
+    for p in properties:
+        if len(p) == 3:
+            n = int(np.frombuffer(data, dtype=endian + p[1], count=1, offset=pos)[0])
+            fields.append((p[0] + '_count', endian + p[1]))
+            fields.append((p[0], endian + p[2], (n,)))
+            pos += np.dtype(p[1]).itemsize + n * np.dtype(p[2]).itemsize
+        else:
+            fields.append((p[0], endian + p[1]))
+            pos += np.dtype(p[1]).itemsize
+    dtype = np.dtype(fields)
+    if offset + count * dtype.itemsize <= len(data):
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        if all(np.all(array[p[0] + '_count'] == dtype[p[0]].shape[0]) for p in properties if len(p) == 3):
+            return {p[0]: array[p[0]] for p in properties}, offset + count * dtype.itemsize
+
+    ret = {p[0]: [] for p in properties}
+    pos = offset
+    for _ in range(count):
+        for p in properties:
+            if len(p) == 3:
+                n = int(np.frombuffer(data, dtype=endian + p[1], count=1, offset=pos)[0])
+                pos += np.dtype(p[1]).itemsize
+                ret[p[0]].append(np.frombuffer(data, dtype=endian + p[2], count=n, offset=pos))
+                pos += n * np.dtype(p[2]).itemsize
+            else:
+                ret[p[0]].append(np.frombuffer(data, dtype=endian + p[1], count=1, offset=pos)[0])
+                pos += np.dtype(p[1]).itemsize
+    return ret, pos
+
+
+def _read_ply_ascii_element(lines: list, count: int, properties: list) -> dict:
+    if all(len(p) == 2 for p in properties):
+        array = np.array(' '.join(lines).split(), dtype=np.float64).reshape(count, len(properties))
+        return {p[0]: array[:, i] for i, p in enumerate(properties)}
+    ret = {p[0]: [] for p in properties}
+    for line in lines:
+        tokens = line.split()
+        pos = 0
+        for p in properties:
+            if len(p) == 3:
+                n = int(tokens[pos])
+                ret[p[0]].append(np.array(tokens[pos + 1:pos + 1 + n], dtype=np.int64))
+                pos += 1 + n
+            else:
+                ret[p[0]].append(float(tokens[pos]))
+                pos += 1
+    return ret
+
+
+def _get_ply_vertex_attributes(vertex: dict, properties: list) -> dict:
+    """return the vertex colors (N, 4) in range [0, 1] and the uv coordinates (N, 2) of ply vertices if present"""
+    attributes = {}
+    dtypes = {p[0]: np.dtype(p[1]) for p in properties if len(p) == 2}
+    if all(name in vertex for name in ['red', 'green', 'blue']):
+        channels = []
+        for name in ['red', 'green', 'blue', 'alpha']:
+            if name not in vertex:
+                channels.append(np.ones(len(vertex['red']), dtype=np.float32))
+                continue
+            channel = np.asarray(vertex[name], dtype=np.float32)
+            if dtypes[name].kind in 'iu':
+                channel = channel / np.iinfo(dtypes[name]).max
+            channels.append(channel)
+        attributes['colors'] = np.stack(channels, axis=-1)
+    for u, v in _PLY_UV_NAMES:
+        if u in vertex and v in vertex:
+            attributes['uvs'] = np.stack([vertex[u], vertex[v]], axis=-1).astype(np.float32)
+            break
+    return attributes
+
+
+def _read_ply(filepath: str) -> (np.ndarray, np.ndarray, np.ndarray, dict):
+    with open(filepath, 'rb') as f:
+        ply_format, elements = _parse_ply_header(f)
+        data = f.read()
+
+    values = {}
+    if ply_format == 'ascii':
+        lines = data.decode('ascii').splitlines()
+        pos = 0
+        for name, count, properties in elements:
+            values[name] = _read_ply_ascii_element(lines[pos:pos + count], count, properties)
+            pos += count
+    elif ply_format in ['binary_little_endian', 'binary_big_endian']:
+        endian = '<' if ply_format == 'binary_little_endian' else '>'
+        offset = 0
+        for name, count, properties in elements:
+            values[name], offset = _read_ply_binary_element(data, offset, count, properties, endian)
+            if 'vertex' in values and 'face' in values:
+                break
+    else:
+        raise Exception('Unsupported PLY format: {}'.format(ply_format))
+
+    if 'vertex' not in values:
+        raise Exception('No vertex in PLY file: {}'.format(filepath))
+    vertices = np.stack([values['vertex'][axis] for axis in ['x', 'y', 'z']], axis=-1).astype(np.float32)
+    faces = values.get('face', {})
+    indices = faces.get('vertex_indices', faces.get('vertex_index', []))
+    if isinstance(indices, np.ndarray):
+        loop_totals = np.full(len(indices), indices.shape[1] if indices.ndim == 2 else 0, dtype=np.int32)
+        loop_vertices = indices.astype(np.int32).ravel()
+    else:
+        loop_totals = np.array([len(face) for face in indices], dtype=np.int32)
+        loop_vertices = np.concatenate(indices).astype(np.int32) if indices else np.zeros(0, dtype=np.int32)
+    vertex_properties = [properties for name, _, properties in elements if name == 'vertex'][0]
+    attributes = _get_ply_vertex_attributes(values['vertex'], vertex_properties)
+    return vertices, loop_vertices, loop_totals, attributes
+
+
+def read_mesh_file(filepath: str, with_attributes: bool = False) -> tuple:
+    """Read a mesh file with numpy, without blender operators
+
+    :param filepath: model file path, supported format: ply (ascii | binary) | stl (ascii | binary)
+    :type filepath: str
+    :param with_attributes: also return the vertex attributes of ply files, keys: colors (N, 4) RGBA in range [0, 1]
+        and uvs (N, 2), only present in the file are returned
+    :type with_attributes: bool
+    :return: vertices (N, 3), vertex indices of all faces concatenated (L,) and number of vertices of each face (M,),
+        and the dict of vertex attributes if *with_attributes*
+    :rtype: tuple
+    """
+    ext = os.path.splitext(filepath)[-1].lower()
+    if ext == '.ply':
+        vertices, loop_vertices, loop_totals, attributes = _read_ply(filepath)
+    elif ext == '.stl':
+        vertices, triangles = _read_stl(filepath)
+        loop_vertices = triangles.astype(np.int32).ravel()
+        loop_totals = np.full(len(triangles), 3, dtype=np.int32)
+        attributes = {}
+    else:
+        raise Exception('Unsupported mesh file format: {}'.format(ext))
+    if with_attributes:
+        return vertices, loop_vertices, loop_totals, attributes
+    return vertices, loop_vertices, loop_totals
+
+
+def write_mesh_file(filepath: str, vertices: np.ndarray, triangles: np.ndarray, normals: np.ndarray = None,
+                    uvs: np.ndarray = None, colors: np.ndarray = None):
+    """Write a triangle mesh to a binary file with numpy, without blender operators. The vertex attributes are only
+    written to ply, stl keeps the face normals only
+
+    :param filepath: output filepath, supported file format: ply | stl
+    :type filepath: str
+    :param vertices: vertices (N, 3)
+    :type vertices: np.ndarray
+    :param triangles: vertex indices of triangles (M, 3)
+    :type triangles: np.ndarray
+    :param normals: vertex normals (N, 3), written as nx, ny, nz
+    :type normals: np.ndarray
+    :param uvs: vertex uv coordinates (N, 2), written as s, t
+    :type uvs: np.ndarray
+    :param colors: vertex RGBA colors (N, 4) in [0, 1], written as uchar red, green, blue, alpha
+    :type colors: np.ndarray
+    """
+    ext = os.path.splitext(filepath)[-1].lower()
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if ext == '.stl':
+        array = np.zeros(len(triangles), dtype=_STL_DTYPE)
+        array['vertices'] = vertices[triangles]
+        normals = np.cross(array['vertices'][:, 1] - array['vertices'][:, 0],
+                           array['vertices'][:, 2] - array['vertices'][:, 0])
+        lengths = np.linalg.norm(normals, axis=-1, keepdims=True)
+        array['normal'] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+        with open(filepath, 'wb') as f:
+            f.write(b'Binary STL written by BlenderFunc'.ljust(80, b' '))
+            f.write(np.array([len(triangles)], dtype='<u4').tobytes())
+            f.write(array.tobytes())
+    elif ext == '.ply':
+        faces = np.zeros(len(triangles), dtype=[('count', 'u1'), ('vertex_indices', '<i4', (3,))])
+        faces['count'] = 3
+        faces['vertex_indices'] = triangles
+        fields = [(('x', 'y', 'z'), '<f4', vertices)]
+        if normals is not None:
+            fields.append((('nx', 'ny', 'nz'), '<f4', np.asarray(normals).reshape(-1, 3)))
+        if uvs is not None:
+            fields.append((('s', 't'), '<f4', np.asarray(uvs).reshape(-1, 2)))
+        if colors is not None:
+            colors = np.round(np.clip(np.asarray(colors, dtype=np.float64).reshape(-1, 4), 0, 1) * 255)
+            fields.append((('red', 'green', 'blue', 'alpha'), 'u1', colors))
+        points = np.zeros(len(vertices), dtype=[(name, dtype) for names, dtype, _ in fields for name in names])
+        for names, _, values in fields:
+            if len(values) != len(vertices):
+                raise Exception('Vertex attributes ({}) do not match vertices ({})'.format(len(values), len(vertices)))
+            for i, name in enumerate(names):
+                points[name] = values[:, i]
+        properties = ['property {} {}'.format('float' if dtype == '<f4' else 'uchar', name)
+                      for names, dtype, _ in fields for name in names]
+        header = '\n'.join(['ply', 'format binary_little_endian 1.0', 'comment written by BlenderFunc',
+                            'element vertex {}'.format(len(vertices))] + properties +
+                           ['element face {}'.format(len(triangles)),
+                            'property list uchar int vertex_indices', 'end_header']) + '\n'
+        with open(filepath, 'wb') as f:
+            f.write(header.encode('ascii'))
+            f.write(points.tobytes())
+            f.write(faces.tobytes())
+    else:
+        raise Exception('Unsupported mesh file format: {}'.format(ext))
+
+
+__all__ = ['read_mesh_file', 'write_mesh_file']
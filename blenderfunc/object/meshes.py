@@ -3,7 +3,11 @@ import bpy
 import bmesh
 import numpy as np
 from typing import List
-from blenderfunc.utility.utility import get_object_by_name
+from mathutils import Matrix, Vector
+from mathutils.bvhtree import BVHTree
+from blenderfunc.utility.utility import get_object_by_name, _scene_reset_callbacks
+from blenderfunc.utility.cache import _get_cache_filepath, _save_cache_npz
+from blenderfunc.object.mesh_io import read_mesh_file, write_mesh_file
 
 
 def _make_smart_uv_project(obj_name: str):
@@ -20,33 +24,198 @@ def _make_smart_uv_project(obj_name: str):
         raise Exception("only MESH object can be smart uv project")
 
 
+# walls of tote physics proxy are at least this thick
+_MIN_PROXY_THICKNESS = 0.05
+
+# surface patches of convex decomposition are extruded inwards by this ratio of the mesh size, and pieces with less
+# volume than this ratio of the cube of mesh size are dropped
+_PIECE_THICKNESS_RATIO = 0.05
+_MIN_PIECE_VOLUME_RATIO = 1e-4
+
+# caches of mesh datablocks in local coordinates, key=mesh name, value=dict, shared by linked duplicates
+_mesh_cache = {}
+
+# geometry of primitives, key=(kind, parameters), value=(vertices, loop_vertices, loop_totals, loop_uvs)
+_primitive_cache = {}
+
+# world space bounding boxes of objects picked by remove_highest_mesh_objects, consumed by
+# physics_simulation(local_wake_up=True)
+_removed_bounds = []
+
+# names of scene objects indexed by type and by custom properties, maintained by the add_*, remove_* functions and
+# set_custom_properties. Names are stored as keys of dicts, i.e. insertion ordered sets. It is rebuilt if the number
+# of objects does not match, e.g. after undo or objects added by other code, and reset by remove_all_data()
+_object_registry = {'num_objects': -1, 'types': {}, 'proxies': set(), 'properties': {}}
+
+
+def _rebuild_object_registry():
+    types = {}
+    proxies = set()
+    for obj in bpy.data.objects:
+        types.setdefault(obj.type, {})[obj.name] = None
+        if obj.get('physics_proxy_of', None) is not None:
+            proxies.add(obj.name)
+    _object_registry['types'] = types
+    _object_registry['proxies'] = proxies
+    _object_registry['properties'] = {}
+    _object_registry['num_objects'] = len(bpy.data.objects)
+
+
+def _invalidate_object_registry():
+    _object_registry['num_objects'] = -1
+
+
+def _reset_object_registry():
+    _object_registry['types'] = {}
+    _object_registry['proxies'] = set()
+    _object_registry['properties'] = {}
+    _invalidate_object_registry()
+
+
+def _get_object_registry() -> dict:
+    if _object_registry['num_objects'] != len(bpy.data.objects):
+        _rebuild_object_registry()
+    return _object_registry
+
+
+def _get_property_index_key(value):
+    """return the key of custom property value in the property index, None if the value can not be indexed"""
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return None
+
+
+def _get_property_index(key: str) -> dict:
+    """return the index of custom property of mesh objects, key=property value, value=ordered set of object names"""
+    registry = _get_object_registry()
+    if key not in registry['properties']:
+        index = {}
+        for name in registry['types'].get('MESH', {}):
+            value = _get_property_index_key(bpy.data.objects[name].get(key, None))
+            if value is not None:
+                index.setdefault(value, {})[name] = None
+        registry['properties'][key] = index
+    return registry['properties'][key]
+
+
+def _set_object_property(obj: bpy.types.Object, key: str, value):
+    """set a custom property of a registered object and keep the property index up to date"""
+    obj[key] = value
+    index = _object_registry['properties'].get(key, None)
+    if index is None or obj.type != 'MESH':
+        return
+    for index_names in index.values():
+        index_names.pop(obj.name, None)
+    value = _get_property_index_key(value)
+    if value is not None:
+        index.setdefault(value, {})[obj.name] = None
+
+
+def _register_objects(objects: List[bpy.types.Object]):
+    """add new objects to the registry, call it after their names and custom properties are set"""
+    registry = _object_registry
+    if registry['num_objects'] + len(objects) != len(bpy.data.objects):
+        _invalidate_object_registry()
+        return
+    for obj in objects:
+        registry['types'].setdefault(obj.type, {})[obj.name] = None
+        if obj.get('physics_proxy_of', None) is not None:
+            registry['proxies'].add(obj.name)
+        if obj.type == 'MESH':
+            for key, index in registry['properties'].items():
+                value = _get_property_index_key(obj.get(key, None))
+                if value is not None:
+                    index.setdefault(value, {})[obj.name] = None
+    registry['num_objects'] = len(bpy.data.objects)
+
+
+def _unregister_objects(names: List[str]):
+    """remove objects from the registry, call it after they are removed from bpy.data.objects"""
+    registry = _object_registry
+    if registry['num_objects'] - len(names) != len(bpy.data.objects):
+        _invalidate_object_registry()
+        return
+    for name in names:
+        for type_names in registry['types'].values():
+            type_names.pop(name, None)
+        registry['proxies'].discard(name)
+        for index in registry['properties'].values():
+            for index_names in index.values():
+                index_names.pop(name, None)
+    registry['num_objects'] = len(bpy.data.objects)
+
+
+_scene_reset_callbacks.append(_reset_object_registry)
+
+
+def _get_world_bound_box(obj: bpy.types.Object) -> np.ndarray:
+    """return world space axis aligned bounding box of object, [[xmin, ymin, zmin], [xmax, ymax, zmax]]"""
+    corners = np.array(obj.bound_box)
+    matrix_world = np.array(obj.matrix_world)
+    corners = corners.dot(matrix_world[:3, :3].T) + matrix_world[:3, 3]
+    return np.array([np.min(corners, axis=0), np.max(corners, axis=0)])
+
+
+def _pop_removed_bounds() -> List[np.ndarray]:
+    global _removed_bounds
+    ret = _removed_bounds
+    _removed_bounds = []
+    return ret
+
+
+_scene_reset_callbacks.append(_pop_removed_bounds)
+
+
 def remove_mesh_object(obj_name: str):
     """Remove the mesh object by its name"""
     obj = bpy.data.objects.get(obj_name, None)
     if obj:
         if obj.type == 'MESH':
+            removed_names = []
+            for child in obj.children:
+                if child.get('physics_proxy_of', None) == obj.name:
+                    removed_names.append(child.name)
+                    bpy.data.objects.remove(child)
+            removed_names.append(obj.name)
             bpy.data.objects.remove(obj)
+            _unregister_objects(removed_names)
         else:
             raise Exception('This object is not a mesh: {}'.format(obj.name))
 
 
-def remove_highest_mesh_object(mesh_objects: List[bpy.types.Object] = None):
-    """Remove the highest mesh object in the scene
+def remove_highest_mesh_objects(k: int, mesh_objects: List[bpy.types.Object] = None) -> List[str]:
+    """Remove the k highest mesh objects in the scene
 
-    :param mesh_objects: the highest object in these objects will be removed, if this value is None, all objects with
+    :param k: number of objects to be removed
+    :type k: int
+    :param mesh_objects: the highest objects in these objects will be removed, if this value is None, all objects with
         custom properties "physics = True" will be selected
     :type mesh_objects: List of bpy.types.Object
+    :return: names of removed objects, from the highest to the lowest
+    :rtype: List of str
     """
     if mesh_objects is None:
         mesh_objects = get_mesh_objects_by_custom_properties({"physics": True})
+    if k <= 0 or len(mesh_objects) == 0:
+        return []
 
-    index = -1
-    height = -float('inf')
-    for i, obj in enumerate(mesh_objects):
-        if obj.location[-1] > height:
-            height = obj.location[-1]
-            index = i
-    remove_mesh_object(mesh_objects[index].name)
+    heights = np.array([obj.location[2] for obj in mesh_objects])
+    indices = np.argsort(-heights, kind='stable')[:k]
+    names = [mesh_objects[i].name for i in indices]
+    for name in names:
+        _removed_bounds.append(_get_world_bound_box(bpy.data.objects[name]))
+        remove_mesh_object(name)
+    return names
+
+
+def remove_highest_mesh_object(mesh_objects: List[bpy.types.Object] = None):
+    """Remove the highest mesh object in the scene
+
+    :param mesh_objects: the highest object in these objects will be removed, if this value is None, all objects with
+        custom properties "physics = True" will be selected
+    :type mesh_objects: List of bpy.types.Object
+    """
+    remove_highest_mesh_objects(1, mesh_objects)
 
 
 def remove_mesh_objects_out_box(box: List[float], mesh_objects: List[bpy.types.Object] = None) -> int:
@@ -64,79 +233,216 @@ def remove_mesh_objects_out_box(box: List[float], mesh_objects: List[bpy.types.O
         mesh_objects = get_mesh_objects_by_custom_properties({"physics": True})
 
     xmin, xmax, ymin, ymax, zmin, zmax = box
-    num = 0
+    box_min = np.array([xmin, ymin, zmin])
+    box_max = np.array([xmax, ymax, zmax])
+    out_names = []
     for obj in mesh_objects:
-        pts = np.array([v.co for v in obj.data.vertices])
-        pts_ = np.hstack([pts, np.ones(len(pts))[:, np.newaxis]])
+        # the extreme points of a mesh in any pose are vertices of its convex hull, shared by linked duplicates
+        pts = _get_cached_hull_vertices(obj.data)
+        if len(pts) == 0:
+            # degenerate hull, e.g. of a flat mesh
+            pts, _ = _get_cached_mesh_arrays(obj.data)
+        if len(pts) == 0:
+            continue
         matrix_world = np.array(obj.matrix_world)
-        pts = pts_.dot(matrix_world.T)[:, :3]
-        pts_min = np.min(pts, axis=0)
-        pts_max = np.max(pts, axis=0)
-        if pts_min[0] < xmin or pts_min[1] < ymin or pts_min[2] < zmin or \
-                pts_max[0] > xmax or pts_max[1] > ymax or pts_max[2] > zmax:
-            remove_mesh_object(obj.name)
-            num += 1
-    return num
-
-
-def add_plane(size: float = 1.0, location: List[float] = None, name: str = 'Plane', properties: dict = None) -> str:
-    """Add a plane to the scene"""
-    if location is None:
-        location = [0, 0, 0]
-    bpy.ops.mesh.primitive_plane_add(size=size, location=location)
-    obj = bpy.context.active_object
-    obj.name = name
-    obj.data.name = name
+        pts = pts.dot(matrix_world[:3, :3].T) + matrix_world[:3, 3]
+        if np.any(pts.min(axis=0) < box_min) or np.any(pts.max(axis=0) > box_max):
+            out_names.append(obj.name)
+    for name in out_names:
+        remove_mesh_object(name)
+    return len(out_names)
+
+
+def _box_project_uvs(vertices: np.ndarray, loop_vertices: np.ndarray, loop_totals: np.ndarray) -> np.ndarray:
+    """uv of each loop by projecting polygons onto the axis plane most aligned with their normals, scaled by the
+    largest dimension of mesh so that textures keep their aspect ratio"""
+    loop_starts = np.cumsum(loop_totals) - loop_totals
+    polygon_index = np.repeat(np.arange(len(loop_totals)), loop_totals)
+    # normal of each polygon from its first three vertices
+    p0 = vertices[loop_vertices[loop_starts]]
+    p1 = vertices[loop_vertices[loop_starts + 1]]
+    p2 = vertices[loop_vertices[loop_starts + 2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    axis = np.argmax(np.abs(normals), axis=-1)[polygon_index]
+    u_axis = np.where(axis == 0, 1, 0)
+    v_axis = np.where(axis == 2, 1, 2)
+    points = vertices[loop_vertices] - vertices.min(axis=0)
+    scale = max((vertices.max(axis=0) - vertices.min(axis=0)).max(), 1e-12)
+    loop_index = np.arange(len(loop_vertices))
+    return np.stack([points[loop_index, u_axis], points[loop_index, v_axis]], axis=-1) / scale
+
+
+def _plane_geometry(size: float) -> tuple:
+    s = size / 2
+    vertices = np.array([[-s, -s, 0], [s, -s, 0], [s, s, 0], [-s, s, 0]], dtype=np.float64)
+    loop_vertices = np.array([0, 1, 2, 3])
+    loop_uvs = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64)
+    return vertices, loop_vertices, np.array([4]), loop_uvs
+
+
+def _box_geometry(size: List[float]) -> tuple:
+    sx, sy, sz = size[0] / 2, size[1] / 2, size[2] / 2
+    vertices = np.array([[-sx, -sy, -sz], [sx, -sy, -sz], [sx, sy, -sz], [-sx, sy, -sz],
+                         [-sx, -sy, sz], [sx, -sy, sz], [sx, sy, sz], [-sx, sy, sz]], dtype=np.float64)
+    loop_vertices = np.array([0, 3, 2, 1, 4, 5, 6, 7, 0, 1, 5, 4, 1, 2, 6, 5, 2, 3, 7, 6, 3, 0, 4, 7])
+    loop_totals = np.full(6, 4)
+    return vertices, loop_vertices, loop_totals, _box_project_uvs(vertices, loop_vertices, loop_totals)
+
+
+def _ico_sphere_geometry(radius: float, subdivisions: int) -> tuple:
+    """icosahedron subdivided subdivisions - 1 times like bpy.ops.mesh.primitive_ico_sphere_add, with spherical uv"""
+    z = 1 / np.sqrt(5)
+    r = 2 / np.sqrt(5)
+    angles = np.arange(5) * 2 * np.pi / 5
+    vertices = np.concatenate([[[0, 0, 1]],
+                               np.stack([r * np.cos(angles), r * np.sin(angles), np.full(5, z)], axis=-1),
+                               np.stack([r * np.cos(angles + np.pi / 5), r * np.sin(angles + np.pi / 5),
+                                         np.full(5, -z)], axis=-1),
+                               [[0, 0, -1]]])
+    i = np.arange(5)
+    j = (i + 1) % 5
+    triangles = np.concatenate([np.stack([np.zeros(5, dtype=int), 1 + i, 1 + j], axis=-1),
+                                np.stack([1 + i, 6 + i, 1 + j], axis=-1),
+                                np.stack([1 + j, 6 + i, 6 + j], axis=-1),
+                                np.stack([6 + i, np.full(5, 11), 6 + j], axis=-1)])
+    for _ in range(max(subdivisions, 1) - 1):
+        # split every triangle into four, the midpoints of shared edges are shared
+        edges = np.sort(np.stack([triangles[:, [0, 1, 2]], triangles[:, [1, 2, 0]]], axis=-1).reshape(-1, 2), axis=-1)
+        unique_edges, edge_index = np.unique(edges, axis=0, return_inverse=True)
+        midpoints = vertices[unique_edges].mean(axis=1)
+        midpoints /= np.linalg.norm(midpoints, axis=-1, keepdims=True)
+        m = edge_index.reshape(-1, 3) + len(vertices)
+        vertices = np.concatenate([vertices, midpoints])
+        a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        triangles = np.concatenate([np.stack([a, m[:, 0], m[:, 2]], axis=-1),
+                                    np.stack([m[:, 0], b, m[:, 1]], axis=-1),
+                                    np.stack([m[:, 2], m[:, 1], c], axis=-1),
+                                    np.stack([m[:, 0], m[:, 1], m[:, 2]], axis=-1)])
+
+    points = vertices[triangles]
+    u = 0.5 + np.arctan2(points[..., 1], points[..., 0]) / (2 * np.pi)
+    v = 0.5 + np.arcsin(np.clip(points[..., 2], -1, 1)) / np.pi
+    # triangles across the seam, and poles which take the u of the other two vertices
+    u = np.where(u.max(axis=-1, keepdims=True) - u > 0.5, u + 1, u)
+    poles = np.abs(points[..., 2]) > 1 - 1e-9
+    u = np.where(poles, (u.sum(axis=-1, keepdims=True) - u) / 2, u)
+    loop_uvs = np.stack([u, v], axis=-1).reshape(-1, 2)
+    return vertices * radius, triangles.ravel(), np.full(len(triangles), 3), loop_uvs
+
+
+def _cylinder_geometry(radius: float, depth: float, num_vertices: int) -> tuple:
+    """cylinder along z axis like bpy.ops.mesh.primitive_cylinder_add, the side is mapped to the lower half of uv
+    and the caps to two circles in the upper half"""
+    n = num_vertices
+    angles = np.arange(n) * 2 * np.pi / n
+    circle = np.stack([-np.sin(angles), np.cos(angles)], axis=-1)
+    vertices = np.concatenate([np.hstack([circle * radius, np.full((n, 1), -depth / 2)]),
+                               np.hstack([circle * radius, np.full((n, 1), depth / 2)])])
+    i = np.arange(n)
+    j = (i + 1) % n
+    sides = np.stack([i, j, n + j, n + i], axis=-1)
+    side_u = np.stack([i, i + 1, i + 1, i], axis=-1) / n
+    side_v = np.tile([0, 0, 0.5, 0.5], (n, 1))
+    top = n + i
+    bottom = i[::-1]
+    loop_vertices = np.concatenate([sides.ravel(), top, bottom])
+    loop_totals = np.concatenate([np.full(n, 4), [n, n]])
+    loop_uvs = np.concatenate([np.stack([side_u, side_v], axis=-1).reshape(-1, 2),
+                               circle * 0.25 + [0.25, 0.75],
+                               circle[::-1] * 0.25 + [0.75, 0.75]])
+    return vertices, loop_vertices, loop_totals, loop_uvs
+
+
+def _get_primitive_geometry(kind: str, builder, *params) -> tuple:
+    key = (kind,) + tuple(params)
+    if key not in _primitive_cache:
+        _primitive_cache[key] = builder(*params)
+    return _primitive_cache[key]
+
+
+def _add_primitive(name: str, geometry: tuple, location: List[float] = None, properties: dict = None) -> str:
+    """build the mesh of primitive with the data API and link the object to the scene"""
+    vertices, loop_vertices, loop_totals, loop_uvs = geometry
+    mesh = _create_mesh_from_polygons(name, vertices, loop_vertices, loop_totals, loop_uvs=loop_uvs)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    if location is not None:
+        obj.location = location
 
     if properties is not None:
         for key, value in properties.items():
             obj[key] = value
+    _register_objects([obj])
     return obj.name
 
 
+def add_plane(size: float = 1.0, location: List[float] = None, name: str = 'Plane', properties: dict = None) -> str:
+    """Add a plane to the scene"""
+    return _add_primitive(name, _get_primitive_geometry('plane', _plane_geometry, size), location, properties)
+
+
 def add_cube(size: float = 2.0, name: str = 'Cube', properties: dict = None) -> str:
     """Add a cube to the scene"""
-    bpy.ops.mesh.primitive_cube_add(size=size)
-    obj = bpy.context.active_object
-    obj.name = name
-    obj.data.name = name
-
-    if properties is not None:
-        for key, value in properties.items():
-            obj[key] = value
-    return obj.name
+    geometry = _get_primitive_geometry('box', _box_geometry, (size, size, size))
+    return _add_primitive(name, geometry, properties=properties)
 
 
 def add_ball(radius: float = 1.0, subdivisions=4, name: str = 'Ball', properties: dict = None) -> str:
     """Add a ball to the scene"""
-    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivisions, radius=radius)
-    obj = bpy.context.active_object
-    obj.name = name
-    obj.data.name = name
-
-    if properties is not None:
-        for key, value in properties.items():
-            obj[key] = value
-    return obj.name
+    geometry = _get_primitive_geometry('ico_sphere', _ico_sphere_geometry, radius, subdivisions)
+    return _add_primitive(name, geometry, properties=properties)
 
 
 def add_cylinder(radius: float = 0.1, depth: float = 0.3, vertices: int = 64, name: str = 'Cylinder',
                  properties: dict = None) -> str:
     """Add a cylinder to the scene"""
-    bpy.ops.mesh.primitive_cylinder_add(vertices=vertices, radius=radius, depth=depth)
-    obj = bpy.context.active_object
-    obj.name = name
-    obj.data.name = name
-
-    if properties is not None:
-        for key, value in properties.items():
-            obj[key] = value
-    return obj.name
-
-
-def add_tote(length: float = 1.0, width: float = 1.0, height: float = 0.5, thickness: float = 0.02,
-             name: str = 'Tote', properties: dict = None) -> str:
-    """Add a tote to the scene"""
+    geometry = _get_primitive_geometry('cylinder', _cylinder_geometry, radius, depth, vertices)
+    return _add_primitive(name, geometry, properties=properties)
+
+
+def _create_box_mesh(name: str, size: List[float]) -> bpy.types.Mesh:
+    vertices, loop_vertices, loop_totals, _ = _get_primitive_geometry('box', _box_geometry, tuple(size))
+    mesh = _create_mesh_from_polygons(name, vertices, loop_vertices, loop_totals)
+    mesh['center_of_mass'] = 'volume'
+    return mesh
+
+
+def _add_tote_physics_proxy(tote: bpy.types.Object, length: float, width: float, height: float, thickness: float,
+                            fence_height: float = None, collision_margin: float = None):
+    """Add five passive box walls as the collision shape of tote, they are parented to the tote and hidden in
+    rendering. A thin wall is thickened outwards so that fast objects do not tunnel through it"""
+    t = max(thickness, _MIN_PROXY_THICKNESS)
+    z_bottom = thickness - t
+    z_top = height + thickness if fence_height is None else max(height + thickness, fence_height)
+    wall_height = z_top - z_bottom
+    boxes = {
+        'Bottom': ([0, 0, thickness - t / 2], [length + 2 * t, width + 2 * t, t]),
+        'Left': ([-length / 2 - t / 2, 0, z_bottom + wall_height / 2], [t, width + 2 * t, wall_height]),
+        'Right': ([length / 2 + t / 2, 0, z_bottom + wall_height / 2], [t, width + 2 * t, wall_height]),
+        'Front': ([0, -width / 2 - t / 2, z_bottom + wall_height / 2], [length, t, wall_height]),
+        'Back': ([0, width / 2 + t / 2, z_bottom + wall_height / 2], [length, t, wall_height]),
+    }
+    proxies = []
+    for side, (location, size) in boxes.items():
+        box_name = '{}_Collider_{}'.format(tote.name, side)
+        box = bpy.data.objects.new(box_name, _create_box_mesh(box_name, size))
+        bpy.context.scene.collection.objects.link(box)
+        box.parent = tote
+        box.location = location
+        box.hide_render = True
+        box.display_type = 'WIRE'
+        box['physics'] = False
+        box['collision_shape'] = 'BOX'
+        box['physics_proxy_of'] = tote.name
+        if collision_margin is not None:
+            box['collision_margin'] = collision_margin
+        proxies.append(box)
+    _register_objects(proxies)
+    _set_object_property(tote, 'use_physics_proxy', True)
+
+
+def _tote_geometry(length: float, width: float, height: float, thickness: float) -> tuple:
+    """triangles of tote with box projected uv, replacing smart uv project which needs edit mode"""
     vertices = [
         # inner points
         (-length / 2, -width / 2, thickness),
@@ -187,25 +493,78 @@ def add_tote(length: float = 1.0, width: float = 1.0, height: float = 0.5, thick
         (6, 15, 7),
         (7, 15, 12),
         (7, 12, 4)]
-    mesh = bpy.data.meshes.new(name)
-    mesh.from_pydata(vertices, [], faces)
-    mesh.update()
-    obj = bpy.data.objects.new(name, mesh)
-    bpy.context.scene.collection.objects.link(obj)
-    _make_smart_uv_project(obj.name)
+    faces = np.array(faces)
+    vertices = np.array(vertices, dtype=np.float64)
+    loop_totals = np.full(len(faces), 3)
+    return vertices, faces.ravel(), loop_totals, _box_project_uvs(vertices, faces.ravel(), loop_totals)
+
+
+def add_tote(length: float = 1.0, width: float = 1.0, height: float = 0.5, thickness: float = 0.02,
+             name: str = 'Tote', physics_proxy: bool = False, fence_height: float = None,
+             properties: dict = None) -> str:
+    """Add a tote to the scene
+
+    :param length: inner x-axis dimension of tote
+    :type length: float
+    :param width: inner y-axis dimension of tote
+    :type width: float
+    :param height: inner z-axis dimension of tote
+    :type height: float
+    :param thickness: thickness of bottom and walls
+    :type thickness: float
+    :param name: object_name
+    :type name: str
+    :param physics_proxy: if true, physics simulation uses five passive boxes instead of the tote mesh as collision
+        shape, which is faster and more stable than "MESH"
+    :type physics_proxy: bool
+    :param fence_height: only works with *physics_proxy*, raise the invisible collision walls to this height to
+        prevent objects from falling outside the tote
+    :type fence_height: float
+    :param properties: custom properties of tote
+    :type properties: dict
+    :return: object_name
+    :rtype: str
+    """
+    tote_properties = dict(tote_size=[length, width, height, thickness])
     if properties is not None:
-        for key, value in properties.items():
-            obj[key] = value
+        tote_properties.update(properties)
+    geometry = _get_primitive_geometry('tote', _tote_geometry, length, width, height, thickness)
+    obj = get_object_by_name(_add_primitive(name, geometry, properties=tote_properties))
+    if physics_proxy:
+        _add_tote_physics_proxy(obj, length, width, height, thickness, fence_height,
+                                collision_margin=obj.get('collision_margin', None))
     return obj.name
 
 
+def _add_mesh_file(filepath: str) -> bpy.types.Object:
+    """read ply or stl file with numpy and link the object to scene, it is much faster than the import operators.
+    Vertex colors and uv coordinates of ply files are kept like the import operator does"""
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    vertices, loop_vertices, loop_totals, attributes = read_mesh_file(filepath, with_attributes=True)
+    loop_uvs = attributes['uvs'][loop_vertices] if 'uvs' in attributes else None
+    loop_colors = attributes['colors'][loop_vertices] if 'colors' in attributes else None
+    mesh = _create_mesh_from_polygons(name, vertices, loop_vertices, loop_totals, loop_uvs=loop_uvs,
+                                      loop_colors=loop_colors)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
 def _add_ply(filepath: str = None) -> bpy.types.Object:
+    try:
+        return _add_mesh_file(filepath)
+    except Exception as e:
+        print('Fall back to PLY import operator: {}'.format(e))
     bpy.ops.import_mesh.ply(filepath=filepath)
     obj = bpy.context.active_object
     return obj
 
 
 def _add_stl(filepath: str = None) -> bpy.types.Object:
+    try:
+        return _add_mesh_file(filepath)
+    except Exception as e:
+        print('Fall back to STL import operator: {}'.format(e))
     bpy.ops.import_mesh.stl(filepath=filepath)
     obj = bpy.context.active_object
     return obj
@@ -229,21 +588,363 @@ def decimate_mesh_object(obj_name: str, max_faces: int = 10000):
     :type max_faces: int
     """
     obj = get_object_by_name(obj_name)
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    mesh = bmesh.from_edit_mesh(obj.data)
-    num_faces_before = len(mesh.faces)
+    num_faces_before = len(obj.data.polygons)
     if num_faces_before > max_faces:
-        ratio = max_faces / num_faces_before
-        bpy.ops.mesh.select_all(action='SELECT')
-        bpy.ops.mesh.decimate(ratio=ratio)
-        num_faces_after = len(mesh.faces)
-        print('Decimate object "{}": {} -> {}'.format(obj_name, num_faces_before, num_faces_after))
-    bpy.ops.object.mode_set(mode='OBJECT')
+        bm = _decimate_to_bmesh(obj.data, max_faces / num_faces_before)
+        bm.to_mesh(obj.data)
+        bm.free()
+        obj.data.update()
+        print('Decimate object "{}": {} -> {}'.format(obj_name, num_faces_before, len(obj.data.polygons)))
+
+
+def _decimate_to_bmesh(mesh: bpy.types.Mesh, ratio: float) -> bmesh.types.BMesh:
+    """evaluate the Decimate modifier on mesh with a temporary object, without edit mode and without changing mesh"""
+    temp_obj = bpy.data.objects.new('Decimate', mesh)
+    bpy.context.scene.collection.objects.link(temp_obj)
+    modifier = temp_obj.modifiers.new('Decimate', 'DECIMATE')
+    modifier.ratio = ratio
+    bm = bmesh.new()
+    bm.from_object(temp_obj, bpy.context.evaluated_depsgraph_get())
+    bpy.data.objects.remove(temp_obj)
+    return bm
+
+
+def _get_physics_mesh(mesh: bpy.types.Mesh, max_faces: int = None) -> (bpy.types.Mesh, np.ndarray):
+    """Return the physics LOD of mesh and its origin in the local coordinates of mesh. The LOD is decimated to
+    max_faces and centered at its center of volume, which rigid bodies use as the center of mass. It is created once
+    and cached per mesh datablock, the mesh itself is returned if it needs neither decimation nor centering"""
+    entry = _get_mesh_cache(mesh)
+    lods = entry.setdefault('physics_lod', {})
+    if max_faces in lods and bpy.data.meshes.get(lods[max_faces][0], None) is not None:
+        return bpy.data.meshes[lods[max_faces][0]], lods[max_faces][1]
+
+    lod = None
+    if max_faces is not None and len(mesh.polygons) > max_faces:
+        lod = bpy.data.meshes.new('{}_Physics'.format(mesh.name))
+        bm = _decimate_to_bmesh(mesh, max_faces / len(mesh.polygons))
+        bm.to_mesh(lod)
+        bm.free()
+        vertices, triangles = _get_mesh_arrays(lod)
+    else:
+        vertices, triangles = _get_cached_mesh_arrays(mesh)
+
+    center = np.zeros(3)
+    if mesh.get('center_of_mass', None) != 'volume' and len(triangles) > 0:
+        center = _compute_center_of_volume(vertices, triangles)
+    if np.linalg.norm(center) > 1e-9:
+        if lod is None:
+            lod = bpy.data.meshes.new('{}_Physics'.format(mesh.name))
+            bm = bmesh.new()
+            bm.from_mesh(mesh)
+            bm.to_mesh(lod)
+            bm.free()
+        lod.vertices.foreach_set('co', (vertices - center).astype(np.float32).ravel())
+        lod.update()
+    if lod is None:
+        lod = mesh
+    else:
+        print('Physics mesh "{}": {} faces'.format(lod.name, len(lod.polygons)))
+    lods[max_faces] = (lod.name, center)
+    return lod, center
+
+
+def _get_mesh_arrays(mesh: bpy.types.Mesh) -> (np.ndarray, np.ndarray):
+    """return vertices (N, 3) and triangles (M, 3) of mesh"""
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get('co', vertices)
+    mesh.calc_loop_triangles()
+    triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int64)
+    mesh.loop_triangles.foreach_get('vertices', triangles)
+    return vertices.reshape(-1, 3), triangles.reshape(-1, 3)
+
+
+def _get_mesh_stamp(mesh: bpy.types.Mesh) -> tuple:
+    """a cheap fingerprint of mesh geometry, changes after decimation, origin shift or undo"""
+    num_vertices = len(mesh.vertices)
+    if num_vertices == 0:
+        return 0, len(mesh.polygons)
+    return (num_vertices, len(mesh.polygons), tuple(mesh.vertices[0].co),
+            tuple(mesh.vertices[num_vertices // 2].co), tuple(mesh.vertices[num_vertices - 1].co))
+
+
+def _get_mesh_cache(mesh: bpy.types.Mesh) -> dict:
+    """return the cache entry of mesh datablock, the entry is reset if the geometry of mesh has changed"""
+    stamp = _get_mesh_stamp(mesh)
+    entry = _mesh_cache.get(mesh.name, None)
+    if entry is None or entry['stamp'] != stamp:
+        entry = {'stamp': stamp}
+        _mesh_cache[mesh.name] = entry
+    return entry
+
+
+def _get_cached_mesh_arrays(mesh: bpy.types.Mesh) -> (np.ndarray, np.ndarray):
+    """same as _get_mesh_arrays but cached per mesh datablock, the returned arrays should not be modified"""
+    entry = _get_mesh_cache(mesh)
+    if 'vertices' not in entry:
+        entry['vertices'], entry['triangles'] = _get_mesh_arrays(mesh)
+    return entry['vertices'], entry['triangles']
+
+
+def _get_mesh_polygons(mesh: bpy.types.Mesh) -> (np.ndarray, np.ndarray, np.ndarray):
+    """return vertices (N, 3), vertex indices of all loops (L,) and number of loops of each polygon (M,)"""
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get('co', vertices)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    return vertices.reshape(-1, 3), loop_vertices, loop_totals
+
+
+def _create_mesh_from_polygons(name: str, vertices: np.ndarray, loop_vertices: np.ndarray, loop_totals: np.ndarray,
+                               loop_uvs: np.ndarray = None, loop_colors: np.ndarray = None) -> bpy.types.Mesh:
+    """create a mesh from the arrays of _get_mesh_polygons without operators, optionally with the uv (L, 2) and the
+    RGBA color (L, 4) of each loop. The loop attributes are set before validation, which may remove invalid polygons
+    together with their loops. Nothing is left in bpy.data.meshes if it fails"""
+    loop_totals = np.asarray(loop_totals, dtype=np.int32)
+    mesh = bpy.data.meshes.new(name)
+    try:
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set('co', np.asarray(vertices, dtype=np.float32).ravel())
+        mesh.loops.add(len(loop_vertices))
+        mesh.loops.foreach_set('vertex_index', np.asarray(loop_vertices, dtype=np.int32).ravel())
+        mesh.polygons.add(len(loop_totals))
+        mesh.polygons.foreach_set('loop_start', (np.cumsum(loop_totals) - loop_totals).astype(np.int32))
+        mesh.polygons.foreach_set('loop_total', loop_totals)
+        if loop_uvs is not None:
+            uv_layer = mesh.uv_layers.new(name='UVMap')
+            uv_layer.data.foreach_set('uv', np.asarray(loop_uvs, dtype=np.float32).ravel())
+        if loop_colors is not None:
+            color_layer = mesh.vertex_colors.new(name='Col')
+            color_layer.data.foreach_set('color', np.asarray(loop_colors, dtype=np.float32).ravel())
+        mesh.update(calc_edges=True)
+        mesh.validate()
+    except Exception:
+        bpy.data.meshes.remove(mesh)
+        raise
+    return mesh
+
+
+def _create_mesh_from_arrays(name: str, vertices: np.ndarray, faces: np.ndarray) -> bpy.types.Mesh:
+    """create a mesh from vertices (N, 3) and faces (M, K) without operators"""
+    faces = np.asarray(faces)
+    return _create_mesh_from_polygons(name, vertices, faces.ravel(), np.full(len(faces), faces.shape[1]))
+
+
+def _convex_hull(points: np.ndarray) -> (np.ndarray, np.ndarray):
+    """return vertices and triangles of the convex hull of points"""
+    bm = bmesh.new()
+    for point in points:
+        bm.verts.new(point)
+    ret = bmesh.ops.convex_hull(bm, input=bm.verts, use_existing_faces=False)
+    bmesh.ops.delete(bm, geom=ret['geom_interior'] + ret['geom_unused'], context='VERTS')
+    bmesh.ops.triangulate(bm, faces=bm.faces)
+    bm.verts.index_update()
+    vertices = np.array([v.co for v in bm.verts], dtype=np.float64).reshape(-1, 3)
+    triangles = np.array([[v.index for v in f.verts] for f in bm.faces], dtype=np.int64).reshape(-1, 3)
+    bm.free()
+    return vertices, triangles
+
+
+def _get_cached_hull(mesh: bpy.types.Mesh) -> (np.ndarray, np.ndarray):
+    """vertices and triangles of the convex hull of mesh in local coordinates, cached per mesh datablock"""
+    entry = _get_mesh_cache(mesh)
+    if 'hull' not in entry:
+        vertices, _ = _get_cached_mesh_arrays(mesh)
+        if len(vertices) >= 4:
+            entry['hull'] = _convex_hull(vertices)
+        else:
+            entry['hull'] = (vertices, np.zeros((0, 3), dtype=np.int64))
+    return entry['hull']
+
+
+def _get_cached_hull_vertices(mesh: bpy.types.Mesh) -> np.ndarray:
+    """vertices of the convex hull of mesh in local coordinates, cached per mesh datablock"""
+    return _get_cached_hull(mesh)[0]
+
+
+def _compute_volume(vertices: np.ndarray, triangles: np.ndarray) -> float:
+    """volume enclosed by a closed triangle mesh, by signed tetrahedron volumes"""
+    if len(triangles) == 0:
+        return 0.0
+    a, b, c = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+    return float(abs(np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6))
+
+
+def mesh_stats(obj_name: str, refresh: bool = False) -> dict:
+    """Get the geometric statistics of the mesh of object, in local coordinates of the mesh without the scale of
+    object. They are computed once per mesh datablock, shared by linked duplicates, and recomputed after the mesh
+    has changed. Changes are detected by the numbers of vertices and faces and the positions of the first, middle
+    and last vertices only, so pass *refresh* after moving other vertices in place. The returned arrays are
+    read-only views of the cache
+
+    :param obj_name: name of object
+    :type obj_name: str
+    :param refresh: drop all cached data of the mesh and recompute the statistics
+    :type refresh: bool
+    :return: statistics, keys:
+
+        - num_vertices(int), num_faces(int), num_triangles(int)
+
+        - volume(float) -- volume enclosed by the mesh, only meaningful for closed meshes
+
+        - center_of_mass(np.ndarray) -- center of volume, (3,)
+
+        - bounding_radius(float) -- max distance from the origin to vertices
+
+        - aabb(np.ndarray) -- axis aligned bounding box, [[xmin, ymin, zmin], [xmax, ymax, zmax]]
+
+        - hull_vertices(np.ndarray), hull_triangles(np.ndarray) -- convex hull
+
+        - hull_volume(float) -- volume of convex hull
+
+    :rtype: dict
+    """
+    mesh = get_object_by_name(obj_name).data
+    if refresh:
+        _mesh_cache.pop(mesh.name, None)
+    entry = _get_mesh_cache(mesh)
+    if 'stats' not in entry:
+        vertices, triangles = _get_cached_mesh_arrays(mesh)
+        hull_vertices, hull_triangles = _get_cached_hull(mesh)
+        has_vertices = len(vertices) > 0
+        entry['stats'] = dict(
+            num_vertices=len(vertices),
+            num_faces=len(mesh.polygons),
+            num_triangles=len(triangles),
+            volume=_compute_volume(vertices, triangles),
+            center_of_mass=_compute_center_of_volume(vertices, triangles) if has_vertices else np.zeros(3),
+            bounding_radius=float(np.linalg.norm(vertices, axis=-1).max()) if has_vertices else 0.0,
+            aabb=np.array([vertices.min(axis=0), vertices.max(axis=0)]) if has_vertices else np.zeros((2, 3)),
+            hull_vertices=hull_vertices,
+            hull_triangles=hull_triangles,
+            hull_volume=_compute_volume(hull_vertices, hull_triangles))
+    ret = {}
+    for key, value in entry['stats'].items():
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.setflags(write=False)
+        ret[key] = value
+    return ret
+
+
+def _approximate_convex_decomposition(vertices: np.ndarray, triangles: np.ndarray, num_pieces: int,
+                                      iterations: int = 20, seed: int = 0) -> List[tuple]:
+    """Split the surface into *num_pieces* spatially compact patches by k-means on triangle centroids, then take the
+    convex hull of each patch. Patches that are not already solid are extruded along the inverted vertex normals so
+    that flat patches have a minimum thickness, the extrusion of each vertex is capped at the local thickness of the
+    mesh, measured by a ray cast to the opposite surface, so that thin walls are not thickened. Unlike a single
+    convex hull, holes larger than a patch are preserved, but a patch spanning a concave opening still fills it"""
+    centroids = vertices[triangles].mean(axis=1)
+    face_normals = np.cross(vertices[triangles[:, 1]] - vertices[triangles[:, 0]],
+                            vertices[triangles[:, 2]] - vertices[triangles[:, 0]])
+    areas = np.linalg.norm(face_normals, axis=-1) / 2
+    vertex_normals = np.zeros_like(vertices)
+    for k in range(3):
+        np.add.at(vertex_normals, triangles[:, k], face_normals)
+    lengths = np.linalg.norm(vertex_normals, axis=-1, keepdims=True)
+    vertex_normals = np.divide(vertex_normals, lengths, out=np.zeros_like(vertex_normals), where=lengths > 0)
+    size = (vertices.max(axis=0) - vertices.min(axis=0)).max()
+    thickness = _PIECE_THICKNESS_RATIO * size
+    min_volume = _MIN_PIECE_VOLUME_RATIO * size ** 3
+    num_pieces = min(num_pieces, len(triangles))
+    random_state = np.random.RandomState(seed)
+    weights = areas / areas.sum() if np.count_nonzero(areas) >= num_pieces else None
+    centers = centroids[random_state.choice(len(centroids), num_pieces, replace=False, p=weights)]
+    labels = np.zeros(len(centroids), dtype=np.int64)
+    for _ in range(iterations):
+        dists = np.linalg.norm(centroids[:, np.newaxis] - centers[np.newaxis], axis=-1)
+        labels = np.argmin(dists, axis=1)
+        for i in range(num_pieces):
+            members = labels == i
+            if np.any(members):
+                centers[i] = np.average(centroids[members], axis=0, weights=areas[members] + 1e-12)
+
+    bvh_tree = BVHTree.FromPolygons(vertices.tolist(), triangles.tolist())
+    eps = 1e-6 * size
+    pieces = []
+    for i in range(num_pieces):
+        members = labels == i
+        indices = np.unique(triangles[members])
+        if len(indices) < 3:
+            continue
+        patch_volume = _compute_volume(*_convex_hull(vertices[indices])) if len(indices) >= 4 else 0.0
+        depths = np.full(len(indices), thickness)
+        for k, index in enumerate(indices):
+            direction = Vector(-vertex_normals[index])
+            location, _, _, distance = bvh_tree.ray_cast(Vector(vertices[index]) + direction * eps, direction)
+            if location is not None:
+                depths[k] = min(thickness, distance + eps)
+        if patch_volume >= areas[members].sum() * depths.mean():
+            # the patch already encloses a solid as thick as the extrusion
+            points = vertices[indices]
+        else:
+            points = np.concatenate([vertices[indices], vertices[indices] - depths[:, np.newaxis] *
+                                     vertex_normals[indices]])
+        hull_vertices, hull_triangles = _convex_hull(points)
+        if len(hull_triangles) >= 4 and _compute_volume(hull_vertices, hull_triangles) >= min_volume:
+            pieces.append((hull_vertices, hull_triangles))
+    return pieces
+
+
+def convex_decompose_mesh_object(obj_name: str, num_pieces: int = 16, cache_filepath: str = None) -> List[str]:
+    """Approximate the mesh of object by a compound of convex pieces, which is used as the collision shape if the
+    custom property of object is "collision_shape = CONVEX_DECOMPOSITION". Linked duplicates share the pieces.
+    Unlike other collision shapes, physics simulation does not move the origin of these objects to their center of
+    mass and the compound rotates around the object origin, call set_origin_to_center_of_mass() before decomposing
+    if needed
+
+    :param obj_name: name of object to be decomposed
+    :type obj_name: str
+    :param num_pieces: max number of convex pieces
+    :type num_pieces: int
+    :param cache_filepath: load the pieces from this ".npz" file if it exists, otherwise save the pieces to it
+    :type cache_filepath: str
+    :return: names of the meshes of convex pieces
+    :rtype: List of str
+    """
+    obj = get_object_by_name(obj_name)
+    if cache_filepath is not None and os.path.exists(cache_filepath):
+        with np.load(cache_filepath) as data:
+            vertex_splits = np.cumsum(data['num_vertices'])[:-1]
+            triangle_splits = np.cumsum(data['num_triangles'])[:-1]
+            pieces = list(zip(np.split(data['vertices'], vertex_splits),
+                              np.split(data['triangles'], triangle_splits)))
+    else:
+        vertices, triangles = _get_mesh_arrays(obj.data)
+        pieces = _approximate_convex_decomposition(vertices, triangles, num_pieces)
+        print('Convex decomposition "{}": {} pieces'.format(obj_name, len(pieces)))
+        if cache_filepath is not None and pieces:
+            _save_cache_npz(cache_filepath, vertices=np.concatenate([p[0] for p in pieces]),
+                            triangles=np.concatenate([p[1] for p in pieces]),
+                            num_vertices=np.array([len(p[0]) for p in pieces]),
+                            num_triangles=np.array([len(p[1]) for p in pieces]))
+
+    for piece_name in obj.data.get('convex_decomposition', []):
+        piece_mesh = bpy.data.meshes.get(piece_name, None)
+        if piece_mesh is not None:
+            bpy.data.meshes.remove(piece_mesh)
+    piece_names = []
+    for i, (vertices, triangles) in enumerate(pieces):
+        piece_mesh = _create_mesh_from_arrays('{}_Piece_{}'.format(obj.data.name, i), vertices, triangles)
+        piece_mesh.use_fake_user = True
+        piece_names.append(piece_mesh.name)
+    obj.data['convex_decomposition'] = piece_names
+    return piece_names
+
+
+def _scale_mesh_to_max_dimension(obj: bpy.types.Object, max_dimension: float):
+    """scale the vertices of mesh so that the max dimension of its bounding box equals max_dimension"""
+    vertices, _, _ = _get_mesh_polygons(obj.data)
+    dimension = (vertices.max(axis=0) - vertices.min(axis=0)).max() if len(vertices) > 0 else 0
+    if dimension > 0:
+        obj.data.vertices.foreach_set('co', (vertices * (max_dimension / dimension)).astype(np.float32).ravel())
+        obj.data.update()
 
 
 def add_object_from_file(filepath: str = None, name: str = "Model", max_faces: int = None,
-                         uv_project: bool = False, properties: dict = None) -> str:
+                         uv_project: bool = False, center_of_mass: bool = False, max_dimension: float = None,
+                         use_cache: bool = True, properties: dict = None) -> str:
     """Add an object from model file
 
     :param filepath: model file path, supported format: ply | stl | obj
@@ -252,13 +953,27 @@ def add_object_from_file(filepath: str = None, name: str = "Model", max_faces: i
     :type name: str
     :param max_faces: decimate the model if the number of faces larger than this value. if this value is None, do nothing
     :type max_faces: int
-    :param uv_project: automatically generate the uv map of this object
+    :param uv_project: automatically generate the uv map of this object, after decimation and scaling
     :type uv_project: bool
+    :param center_of_mass: set the origin of object to its center of volume once after loading, physics simulation
+        will skip the origin recomputation for this mesh and all of its linked duplicates
+    :type center_of_mass: bool
+    :param max_dimension: scale the mesh so that the max dimension of its bounding box equals this value. if this value
+        is None, do nothing
+    :type max_dimension: float
+    :param use_cache: cache the processed geometry of ply and stl files on disk, keyed by file hash and the options
+        above, so that loading the same model again skips importing, decimation, scaling and center of mass. Only
+        vertices and faces are cached, see ``set_cache_dir``
+    :type use_cache: bool
     :param properties: custom properties for physics simulation, useful properties:
 
         - physics(bool) -- if true, the object will be moved in physics simulation, otherwise, only do collision check
 
-        - collision_shape(str) -- collision shape in physics simulation, options: "MESH" or "CONVEX_HULL"
+        - collision_shape(str) -- collision shape in physics simulation, options: "MESH", "CONVEX_HULL" or
+          "CONVEX_DECOMPOSITION". The convex decomposition is computed once per model file and cached on disk,
+          see ``set_cache_dir``
+
+        - convex_pieces(int) -- max number of convex pieces of "CONVEX_DECOMPOSITION", default: 16
 
         - class_id(int) -- class id in ``render_class_segmap``
 
@@ -267,15 +982,32 @@ def add_object_from_file(filepath: str = None, name: str = "Model", max_faces: i
     :rtype: str
     """
     ext = os.path.splitext(filepath)[-1]
-    if ext == '.ply':
-        obj = _add_ply(filepath)
-    elif ext == '.stl':
-        obj = _add_stl(filepath)
-    elif ext == '.obj':
-        obj = _add_obj(filepath)
-    else:
+    if ext not in ['.ply', '.stl', '.obj']:
         raise Exception('Unsupported CAD file format: {}'.format(ext))
 
+    cache_params = dict(max_faces=max_faces, max_dimension=max_dimension, center_of_mass=center_of_mass)
+    cache_filepath = None
+    if use_cache and ext in ['.ply', '.stl']:
+        cache_filepath = _get_cache_filepath('geometry', filepath, '.npz', **cache_params)
+
+    cached = cache_filepath is not None and os.path.exists(cache_filepath)
+    if cached:
+        with np.load(cache_filepath) as data:
+            mesh = _create_mesh_from_polygons(name, data['vertices'], data['loop_vertices'], data['loop_totals'])
+            location = data['location']
+        if center_of_mass:
+            mesh['center_of_mass'] = 'volume'
+        obj = bpy.data.objects.new(name, mesh)
+        bpy.context.scene.collection.objects.link(obj)
+        obj.location = location
+    else:
+        if ext == '.ply':
+            obj = _add_ply(filepath)
+        elif ext == '.stl':
+            obj = _add_stl(filepath)
+        else:
+            obj = _add_obj(filepath)
+
     obj.name = name
     obj.data.name = name
 
@@ -283,12 +1015,33 @@ def add_object_from_file(filepath: str = None, name: str = "Model", max_faces: i
         for key, value in properties.items():
             obj[key] = value
 
+    if not cached:
+        if max_faces is not None:
+            decimate_mesh_object(obj.name, max_faces)
+
+        if max_dimension is not None:
+            _scale_mesh_to_max_dimension(obj, max_dimension)
+
+        if center_of_mass:
+            set_origin_to_center_of_mass(obj.name, mode='volume')
+
+        # the geometry cache does not keep vertex colors and uv maps of the file
+        if cache_filepath is not None and len(obj.data.uv_layers) == 0 and len(obj.data.vertex_colors) == 0:
+            vertices, loop_vertices, loop_totals = _get_mesh_polygons(obj.data)
+            _save_cache_npz(cache_filepath, vertices=vertices, loop_vertices=loop_vertices, loop_totals=loop_totals,
+                            location=np.array(obj.location))
+
+    # uv map is projected on the processed mesh, which is the same with or without cache
     if uv_project:
         _make_smart_uv_project(obj.name)
 
-    if max_faces is not None:
-        decimate_mesh_object(obj.name, max_faces)
+    if obj.get('collision_shape', None) == 'CONVEX_DECOMPOSITION':
+        num_pieces = obj.get('convex_pieces', 16)
+        decomposition_filepath = _get_cache_filepath('convex_decomposition', filepath, '.npz', num_pieces=num_pieces,
+                                                     **cache_params)
+        convex_decompose_mesh_object(obj.name, num_pieces, decomposition_filepath)
 
+    _register_objects([obj])
     return obj.name
 
 
@@ -300,14 +1053,53 @@ def duplicate_mesh_object(obj_name: str) -> str:
     :return: object_name of new object
     :rtype: str
     """
+    return instantiate_mesh_object(obj_name, 1)[0]
+
+
+def instantiate_mesh_object(obj_name: str, n: int, matrices: np.ndarray = None, properties: dict = None) -> List[str]:
+    """Create n linked duplicates of the mesh object, they share the mesh datablock and materials of the object and
+    are linked to the same collections. Much faster than calling ``duplicate_mesh_object`` in a loop, since no
+    operator or selection is involved
+
+    :param obj_name: the name of object to be instantiated
+    :type obj_name: str
+    :param n: number of new objects
+    :type n: int
+    :param matrices: (n, 4, 4) world matrices of new objects, if this value is None, new objects have the same
+        transform as the object
+    :type matrices: np.ndarray
+    :param properties: custom properties set on new objects in addition to the ones copied from the object
+    :type properties: dict
+    :return: object_names of new objects
+    :rtype: List of str
+    """
     obj = get_object_by_name(obj_name)
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.duplicate(linked=True)
-    return bpy.context.active_object.name
+    if obj.type != 'MESH':
+        raise Exception('This object is not a mesh: {}'.format(obj.name))
+    if matrices is not None:
+        matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+        if len(matrices) != n:
+            raise Exception('Number of matrices {} does not match n = {}'.format(len(matrices), n))
+
+    new_objects = []
+    for i in range(n):
+        new_obj = obj.copy()
+        if matrices is not None:
+            new_obj.matrix_world = Matrix(matrices[i].tolist())
+        if properties is not None:
+            for key, value in properties.items():
+                new_obj[key] = value
+        new_objects.append(new_obj)
+    for collection in obj.users_collection or [bpy.context.scene.collection]:
+        for new_obj in new_objects:
+            collection.objects.link(new_obj)
+    _register_objects(new_objects)
+    return [new_obj.name for new_obj in new_objects]
 
 
 def set_origin_to_center_of_mass(obj_name: str, mode: str = 'volume'):
-    """Set the origin of object to its center of mass
+    """Set the origin of object to its center of mass. The result is cached on the mesh data, so linked duplicates
+    share it and physics simulation will not recompute the origin of this mesh
 
     :param obj_name: the name of object
     :type obj_name: str
@@ -319,42 +1111,87 @@ def set_origin_to_center_of_mass(obj_name: str, mode: str = 'volume'):
         raise Exception('Unknown center of mass mode: {}'.format(mode))
 
     obj = get_object_by_name(obj_name)
-    bpy.context.view_layer.objects.active = obj
+    context = {"selected_editable_objects": [obj]}
     if mode == 'volume':
-        bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_VOLUME', center='MEDIAN')
+        bpy.ops.object.origin_set(context, type='ORIGIN_CENTER_OF_VOLUME', center='MEDIAN')
     elif mode == 'surface':
-        bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='MEDIAN')
+        bpy.ops.object.origin_set(context, type='ORIGIN_CENTER_OF_MASS', center='MEDIAN')
+    obj.data['center_of_mass'] = mode
+
+
+def _compute_center_of_volume(vertices: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """center of volume of a closed triangle mesh by signed tetrahedron volumes, the mean of vertices if the mesh
+    has no volume"""
+    a, b, c = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+    volumes = np.einsum('ij,ij->i', a, np.cross(b, c)) / 6
+    if abs(volumes.sum()) < 1e-12:
+        return vertices.mean(axis=0)
+    return (volumes[:, np.newaxis] * (a + b + c) / 4).sum(axis=0) / volumes.sum()
+
+
+def _get_mesh_loop_attributes(mesh: bpy.types.Mesh, vertices: np.ndarray) -> (np.ndarray, np.ndarray, dict):
+    """split the vertices (N, 3) of mesh at the corners with different normals, uvs or colors, as the old ply
+    exporter did, return the split vertices, their triangles and a dict with normals, and uvs and colors if the mesh
+    has the active layers"""
+    mesh.calc_loop_triangles()
+    mesh.calc_normals_split()
+    loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int64)
+    mesh.loop_triangles.foreach_get('loops', loops)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+    loop_normals = np.empty(len(mesh.loops) * 3, dtype=np.float64)
+    mesh.loops.foreach_get('normal', loop_normals)
+    columns = {'normals': loop_normals.reshape(-1, 3)}
+    if mesh.uv_layers.active is not None:
+        loop_uvs = np.empty(len(mesh.loops) * 2, dtype=np.float64)
+        mesh.uv_layers.active.data.foreach_get('uv', loop_uvs)
+        columns['uvs'] = loop_uvs.reshape(-1, 2)
+    if mesh.vertex_colors.active is not None:
+        loop_colors = np.empty(len(mesh.loops) * 4, dtype=np.float64)
+        mesh.vertex_colors.active.data.foreach_get('color', loop_colors)
+        columns['colors'] = loop_colors.reshape(-1, 4)
+    mesh.free_normals_split()
+    # corners sharing the vertex and all attributes are merged back into one vertex
+    records = np.concatenate([loop_vertices[loops, None]] + [columns[key][loops] for key in columns], axis=1)
+    records, inverse = np.unique(records, axis=0, return_inverse=True)
+    vertex_indices = records[:, 0].astype(np.int64)
+    attributes, start = {}, 1
+    for key in columns:
+        width = columns[key].shape[1]
+        attributes[key] = records[:, start:start + width]
+        start += width
+    return vertices[vertex_indices], inverse.reshape(-1, 3), attributes
 
 
 def export_mesh_object(filepath: str, obj_name: str, center_of_mass: bool = False):
-    """Export the mesh object to a specified filepath
+    """Export the mesh object to a specified filepath, the mesh is written in local coordinates with the scale of
+    object applied. Ply also keeps the vertex normals, and the uvs and colors of active layers. The scene is not
+    modified
 
     :param filepath: output filepath, supported file format: ply | stl
     :type filepath: str
     :param obj_name: name of object to be exported
     :type obj_name: str
-    :param center_of_mass: if true, reset the origin of object to its center of mass
+    :param center_of_mass: if true, move the origin of exported mesh to its center of mass
     :type center_of_mass: bool
     """
     ext = os.path.splitext(filepath)[-1]
     if ext not in ['.ply', '.stl']:
         raise Exception('export_mesh only support ply and stl format')
-    bpy.ops.ed.undo_push(message='before export_mesh()')
-    for obj in bpy.data.objects:
-        if obj.name != obj_name:
-            bpy.data.objects.remove(obj)
-    obj = bpy.data.objects[0]
+    obj = get_object_by_name(obj_name)
+    vertices, triangles = _get_mesh_arrays(obj.data)
     if center_of_mass:
-        set_origin_to_center_of_mass(obj_name, mode='VOLUME')
-    obj.location = (0, 0, 0)
-    obj.rotation_euler = (0, 0, 0)
+        vertices = vertices - _compute_center_of_volume(vertices, triangles)
+    scale = np.array(obj.scale)
     if ext == '.ply':
-        bpy.ops.export_mesh.ply(filepath=filepath)
-    elif ext == '.stl':
-        bpy.ops.export_mesh.stl(filepath=filepath)
+        vertices, triangles, attributes = _get_mesh_loop_attributes(obj.data, vertices)
+        normals = attributes['normals'] / scale
+        lengths = np.linalg.norm(normals, axis=-1, keepdims=True)
+        attributes['normals'] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+        write_mesh_file(filepath, vertices * scale, triangles, **attributes)
+    else:
+        write_mesh_file(filepath, vertices * scale, triangles)
     print('Export CAD Model: {}'.format(filepath))
-    bpy.ops.ed.undo_push(message='after export_mesh()')
-    bpy.ops.ed.undo()
 
 
 def separate_isolated_meshes(obj_name: str) -> List[str]:
@@ -371,6 +1208,7 @@ def separate_isolated_meshes(obj_name: str) -> List[str]:
     bpy.ops.object.mode_set(mode='EDIT')
     bpy.ops.mesh.separate(type='LOOSE')
     bpy.ops.object.mode_set(mode='OBJECT')
+    _invalidate_object_registry()
     objects_after_separate = set([obj.name for obj in get_all_mesh_objects()])
     ret_names = list(objects_after_separate - objects_before_separate)
     ret_names.append(obj_name)
@@ -378,6 +1216,68 @@ def separate_isolated_meshes(obj_name: str) -> List[str]:
     return ret_names
 
 
+def _union_find_labels(num_vertices: int, edges: np.ndarray) -> np.ndarray:
+    """connected component labels 0 ~ k-1 of vertices, vectorized union-find by hooking roots to the smaller root
+    and pointer jumping until no edge connects two components"""
+    labels = np.arange(num_vertices)
+    a, b = edges[:, 0], edges[:, 1]
+    while True:
+        label_a, label_b = labels[a], labels[b]
+        label_min = np.minimum(label_a, label_b)
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, label_a, label_min)
+        np.minimum.at(new_labels, label_b, label_min)
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+def loose_part_labels(obj_name: str) -> np.ndarray:
+    """Label the loose parts of a mesh object without creating objects, the same parts as
+    ``separate_isolated_meshes``. The result is cached per mesh datablock
+
+    :param obj_name: name of object
+    :type obj_name: str
+    :return: loose part index of each vertex, 0 ~ number of parts - 1
+    :rtype: np.ndarray
+    """
+    mesh = get_object_by_name(obj_name).data
+    entry = _get_mesh_cache(mesh)
+    if 'loose_part_labels' not in entry:
+        edges = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+        mesh.edges.foreach_get('vertices', edges)
+        entry['loose_part_labels'] = _union_find_labels(len(mesh.vertices), edges.reshape(-1, 2))
+    return entry['loose_part_labels']
+
+
+def count_loose_parts(obj_name: str) -> int:
+    """Count the loose parts of a mesh object without creating objects
+
+    :param obj_name: name of object
+    :type obj_name: str
+    :return: number of loose parts
+    :rtype: int
+    """
+    labels = loose_part_labels(obj_name)
+    return int(labels.max()) + 1 if len(labels) > 0 else 0
+
+
+def _get_world_matrices(objects: List[bpy.types.Object]) -> np.ndarray:
+    """(N, 4, 4) world matrices of objects, read at once with foreach_get"""
+    matrices = np.empty(len(bpy.data.objects) * 16, dtype=np.float32)
+    bpy.data.objects.foreach_get('matrix_world', matrices)
+    # matrices are flattened column by column
+    matrices = matrices.reshape(-1, 4, 4).transpose(0, 2, 1)
+    index = {obj.name: i for i, obj in enumerate(bpy.data.objects)}
+    return matrices[[index[obj.name] for obj in objects]].reshape(-1, 4, 4)
+
+
 def export_meshes_info(filepath: str = '/tmp/temp.csv', visible_ratio: List[float] = None):
     """Export information of all objects in the scene to a csv file, an example of csv file:
 
@@ -387,43 +1287,67 @@ def export_meshes_info(filepath: str = '/tmp/temp.csv', visible_ratio: List[floa
 
     ...
 
-    :param filepath: output filepath
+    or to a ".npz" file with the same columns as arrays, which is loaded without parsing: instance_id (N,),
+    class_id (N,), name (N,), visible_ratio (N,) and pose (N, 4, 4) in float32 as stored by blender
+
+    :param filepath: output filepath, supported file format: csv | npz
     :param visible_ratio: visible ratio of objects
     """
-    if os.path.splitext(filepath)[-1] not in ['.csv']:
-        raise Exception('Unsupported file format: {}'.format(os.path.splitext(filepath)[-1]))
+    ext = os.path.splitext(filepath)[-1]
+    if ext not in ['.csv', '.npz']:
+        raise Exception('Unsupported file format: {}'.format(ext))
 
     output_dir = os.path.abspath(os.path.dirname(filepath))
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
     mesh_objects = get_all_mesh_objects()
+    instance_ids = np.arange(1, len(mesh_objects) + 1, dtype=np.int32)
+    class_ids = np.array([obj.get('class_id', 0) for obj in mesh_objects], dtype=np.int32)
+    names = np.array([obj.name for obj in mesh_objects], dtype=str)
+    poses = _get_world_matrices(mesh_objects)
+
+    if ext == '.npz':
+        ratios = np.full(len(mesh_objects), -1, dtype=np.float32) if visible_ratio is None else visible_ratio
+        np.savez(filepath, instance_id=instance_ids, class_id=class_ids, name=names,
+                 visible_ratio=np.asarray(ratios, dtype=np.float32), pose=poses)
+        return
+
     with open(filepath, 'w') as f:
         f.write('instance_id, class_id, name, visible_ratio, pose\n')
-        for i, obj in enumerate(mesh_objects):
-            instance_id = i + 1
-            class_id = obj.get('class_id', 0)
-            name = obj.name
+        for i in range(len(mesh_objects)):
             vr = -1 if visible_ratio is None else visible_ratio[i]
-            pose = ' '.join([str(obj.matrix_world[i][j]) for i in range(3) for j in range(4)])
-            f.write('{}, {}, {}, {}, {}\n'.format(instance_id, class_id, name, vr, pose))
+            pose = ' '.join([str(v) for v in poses[i, :3].ravel()])
+            f.write('{}, {}, {}, {}, {}\n'.format(instance_ids[i], class_ids[i], names[i], vr, pose))
 
 
-def get_all_mesh_objects() -> List[bpy.types.Object]:
+def get_all_mesh_objects(include_physics_proxies: bool = False) -> List[bpy.types.Object]:
     """Get all mesh objects in the scene
 
+    :param include_physics_proxies: also return the invisible collision shapes only used in physics simulation,
+        e.g. the box walls of ``add_tote(physics_proxy=True)``
+    :type include_physics_proxies: bool
     :return: list of blender objects
     :rtype: List of bpy.types.Object
     """
-    ret = []
-    for obj in bpy.data.objects:
-        if obj.type == 'MESH':
-            ret.append(obj)
+    registry = _get_object_registry()
+    names = registry['types'].get('MESH', {})
+    if not include_physics_proxies:
+        names = [name for name in names if name not in registry['proxies']]
+    ret = [bpy.data.objects.get(name, None) for name in names]
+    if None in ret:
+        # objects were renamed or replaced by other code
+        _rebuild_object_registry()
+        return get_all_mesh_objects(include_physics_proxies)
     return ret
 
 
 def get_mesh_objects_by_custom_properties(properties: dict = None) -> List[bpy.types.Object]:
-    """Get mesh objects have the specified custom properties
+    """Get mesh objects have the specified custom properties. Properties with bool, int, float or str values are
+    looked up in an index built on first use and maintained by the add_* and remove_* functions, so only the matched
+    objects are visited. The index only sees properties set through the *properties* argument of add_* functions or
+    ``set_custom_properties``, objects whose properties are written directly, e.g. ``obj['class_id'] = 1``, may be
+    missed
 
     :param properties: object custom properties
     :type properties: dict
@@ -431,21 +1355,45 @@ def get_mesh_objects_by_custom_properties(properties: dict = None) -> List[bpy.t
     :rtype: List of bpy.types.Object
     """
     if properties is None:
-        properties = []
+        properties = {}
+
+    indices = []
+    for key, value in properties.items():
+        value = _get_property_index_key(value)
+        if value is not None:
+            indices.append(_get_property_index(key).get(value, {}))
+    if not indices:
+        objects = get_all_mesh_objects()
+    else:
+        registry = _get_object_registry()
+        indices.sort(key=len)
+        names = [name for name in indices[0] if name not in registry['proxies'] and
+                 all(name in index for index in indices[1:])]
+        objects = [bpy.data.objects.get(name, None) for name in names]
+        if None in objects:
+            # objects were renamed or replaced by other code
+            _rebuild_object_registry()
+            return get_mesh_objects_by_custom_properties(properties)
 
-    all_objects_set = set(get_all_mesh_objects())
-    not_matched_objects_set = set()
+    return [obj for obj in objects if all(obj.get(key, None) == value for key, value in properties.items())]
 
-    for obj in get_all_mesh_objects():
-        for key, value in properties.items():
-            obj_value = obj.get(key, None)
-            if obj_value != value:
-                not_matched_objects_set.add(obj)
 
-    return list(all_objects_set - not_matched_objects_set)
+def set_custom_properties(obj_name: str, properties: dict):
+    """Set custom properties of object and keep the index of ``get_mesh_objects_by_custom_properties`` up to date
+
+    :param obj_name: name of object
+    :type obj_name: str
+    :param properties: object custom properties
+    :type properties: dict
+    """
+    obj = get_object_by_name(obj_name)
+    for key, value in properties.items():
+        _set_object_property(obj, key, value)
 
 
 __all__ = ['add_plane', 'add_cube', 'add_cylinder', 'add_ball', 'add_tote', 'add_object_from_file',
-           'decimate_mesh_object', 'remove_mesh_object', 'remove_highest_mesh_object', 'remove_mesh_objects_out_box',
-           'duplicate_mesh_object', 'separate_isolated_meshes', 'export_meshes_info', 'export_mesh_object',
-           'get_all_mesh_objects', 'get_mesh_objects_by_custom_properties', 'set_origin_to_center_of_mass']
+           'decimate_mesh_object', 'remove_mesh_object', 'remove_highest_mesh_object', 'remove_highest_mesh_objects',
+           'remove_mesh_objects_out_box', 'duplicate_mesh_object', 'instantiate_mesh_object',
+           'separate_isolated_meshes', 'export_meshes_info', 'export_mesh_object', 'get_all_mesh_objects',
+           'get_mesh_objects_by_custom_properties', 'set_origin_to_center_of_mass', 'convex_decompose_mesh_object',
+           'loose_part_labels', 'count_loose_parts', 'mesh_stats', 'set_custom_properties']
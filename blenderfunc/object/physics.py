@@ -1,15 +1,34 @@
-from typing import Union, Callable
+from typing import Union, Callable, List
 
 import bpy
-import bmesh
 import numpy as np
-import mathutils
-from mathutils import Vector, Euler
+from mathutils import Vector, Matrix
+from mathutils.bvhtree import BVHTree
 
-from blenderfunc.object.meshes import get_all_mesh_objects, decimate_mesh_object
+from blenderfunc.object.meshes import get_all_mesh_objects, _get_world_bound_box, _pop_removed_bounds, \
+    convex_decompose_mesh_object, _get_mesh_cache, _get_cached_mesh_arrays, _get_physics_mesh, _register_objects, \
+    _unregister_objects
 from blenderfunc.utility.utility import seconds_to_frames, get_object_by_name
 
 
+# bounds of automatically chosen simulation settings
+_MIN_AUTO_SUBSTEPS = 5
+_MAX_AUTO_SUBSTEPS = 80
+_MIN_AUTO_SOLVER_ITERATIONS = 10
+_MAX_AUTO_SOLVER_ITERATIONS = 30
+
+# objects spanning more grid cells are not indexed by the broad phase of collision_free_positioning
+_MAX_CELLS_PER_OBJECT = 64
+
+# rerun the simulation with more substeps if more objects than this ratio penetrate each other
+_MAX_INTERPENETRATION_RATIO = 0.05
+
+# objects penetrate each other if a vertex is deeper inside another object than the larger of this number of
+# collision margins and this ratio of the smaller object's dimension, shallower overlaps are resting contacts
+_PENETRATION_TOLERANCE_MARGINS = 4
+_PENETRATION_TOLERANCE_RATIO = 0.05
+
+
 def _enable_rigid_body(obj: bpy.types.Object, physics_type: str = 'PASSIVE',
                        physics_collision_shape: str = 'CONVEX_HULL',
                        physics_collision_margin: float = None):
@@ -20,6 +39,21 @@ def _enable_rigid_body(obj: bpy.types.Object, physics_type: str = 'PASSIVE',
     obj.rigid_body.collision_margin = physics_collision_margin
 
 
+def _add_convex_pieces(obj: bpy.types.Object) -> List[str]:
+    """Add the convex pieces of object as children of its compound rigid body, they only exist during simulation"""
+    pieces = []
+    for piece_name in obj.data['convex_decomposition']:
+        piece = bpy.data.objects.new('{}_{}'.format(obj.name, piece_name), bpy.data.meshes[piece_name])
+        bpy.context.scene.collection.objects.link(piece)
+        piece.parent = obj
+        piece.hide_render = True
+        piece['physics_proxy_of'] = obj.name
+        _enable_rigid_body(piece, obj.rigid_body.type, 'CONVEX_HULL', obj.rigid_body.collision_margin)
+        pieces.append(piece)
+    _register_objects(pieces)
+    return [piece.name for piece in pieces]
+
+
 def _disable_rigid_body(obj: bpy.types.Object):
     bpy.ops.rigidbody.object_remove({'object': obj})
 
@@ -57,7 +91,7 @@ def _persist_transformation_into_mesh(obj: bpy.types.Object, location: bool = Tr
 def _get_active_objects_pose() -> dict:
     objects_poses = {}
     for obj in get_all_mesh_objects():
-        if obj.rigid_body.type == 'ACTIVE':
+        if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE':
             location = bpy.context.scene.objects[obj.name].matrix_world.translation.copy()
             rotation = Vector(bpy.context.scene.objects[obj.name].matrix_world.to_euler())
             objects_poses.update({obj.name: {'location': location, 'rotation': rotation}})
@@ -67,30 +101,7 @@ def _get_active_objects_pose() -> dict:
 
 def _simulation(min_simulation_time: float = 5.0, max_simulation_time: float = 10.0, check_object_interval: float = 1.0,
                 object_stopped_location_threshold: float = 0.01, object_stopped_rotation_threshold: float = 1.0,
-                substeps_per_frame: int = 10, solver_iters: int = 10) -> dict:
-    # Shift the origin of all objects to their center of mass to make the simulation more realistic
-    origin_shift = {}
-    prev_origins = {}
-
-    all_mesh_objects = get_all_mesh_objects()
-    for obj in all_mesh_objects:
-        prev_origins[obj.name] = _get_origin(obj)
-
-    # Select all mesh objects, run origin set
-    for obj in bpy.data.objects:
-        if obj in all_mesh_objects:
-            obj.select_set(True)
-        else:
-            obj.select_set(False)
-    bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_VOLUME', center='MEDIAN')
-
-    for obj in all_mesh_objects:
-        new_origin = _get_origin(obj)
-        origin_shift[obj.name] = new_origin - prev_origins[obj.name]
-
-        # # Persist mesh scaling as having a scale != 1 can make the simulation unstable
-        # persist_transformation_into_mesh(obj, location=False, rotation=False, scale=True)
-
+                substeps_per_frame: int = 10, solver_iters: int = 10, adaptive_substeps: bool = False):
     # Configure simulator
     bpy.context.scene.rigidbody_world.substeps_per_frame = substeps_per_frame
     bpy.context.scene.rigidbody_world.solver_iterations = solver_iters
@@ -98,9 +109,111 @@ def _simulation(min_simulation_time: float = 5.0, max_simulation_time: float = 1
     # Perform simulation
     _bake_physics_simulation(min_simulation_time, max_simulation_time, check_object_interval,
                              object_stopped_location_threshold,
-                             object_stopped_rotation_threshold)
+                             object_stopped_rotation_threshold, adaptive_substeps)
+
+
+def _swap_physics_meshes(max_faces: int = None) -> dict:
+    """Replace the meshes of objects to be simulated by their physics LOD, and move the origins of objects to the
+    origins of the LODs (center of mass) without moving the objects. Call it before enabling rigid bodies so that the
+    collision shapes are built from the LODs. Objects with convex decomposition keep their meshes and origins, since
+    their convex pieces are parented to them
 
-    return origin_shift
+    :return: key=object name, value=(original mesh, original matrix_world, LOD origin in local coordinates)
+    """
+    # objects placed by setting location and rotation have stale world matrices until the depsgraph is updated
+    bpy.context.view_layer.update()
+    swapped = {}
+    for obj in get_all_mesh_objects():
+        if obj.get('use_physics_proxy', False) or obj.get('collision_shape', None) == 'CONVEX_DECOMPOSITION':
+            continue
+        lod, center = _get_physics_mesh(obj.data, max_faces)
+        if lod == obj.data:
+            continue
+        swapped[obj.name] = (obj.data, obj.matrix_world.copy(), Vector(center))
+        obj.data = lod
+        obj.matrix_world = obj.matrix_world @ Matrix.Translation(Vector(center))
+    bpy.context.view_layer.update()
+    return swapped
+
+
+def _auto_substeps_per_frame(active_objects: List[bpy.types.Object]) -> int:
+    """Choose substeps so that the fastest falling object moves less than a fraction of the thinnest object per
+    substep, the fall velocity is estimated from the highest object above the lowest point of the scene"""
+    if not active_objects:
+        return _MIN_AUTO_SUBSTEPS
+    min_dimension = min(min(obj.dimensions) for obj in active_objects)
+    min_margin = min(obj.rigid_body.collision_margin for obj in active_objects)
+    ground_z = min(_get_world_bound_box(obj)[0][2] for obj in get_all_mesh_objects(include_physics_proxies=True))
+    drop_height = max(_get_world_bound_box(obj)[0][2] for obj in active_objects) - ground_z
+    gravity = np.linalg.norm(bpy.context.scene.gravity)
+    velocity = np.sqrt(2 * gravity * max(drop_height, 0))
+    max_step = 0.25 * min_dimension + 2 * min_margin
+    substeps = int(np.ceil(velocity / (bpy.context.scene.render.fps * max_step)))
+    return int(np.clip(substeps, _MIN_AUTO_SUBSTEPS, _MAX_AUTO_SUBSTEPS))
+
+
+def _auto_solver_iterations(active_objects: List[bpy.types.Object]) -> int:
+    """Larger piles need more solver iterations to propagate contact forces, grow logarithmically"""
+    num = max(len(active_objects), 1)
+    iterations = 10 + 2 * int(np.ceil(np.log2(num)))
+    return int(np.clip(iterations, _MIN_AUTO_SOLVER_ITERATIONS, _MAX_AUTO_SOLVER_ITERATIONS))
+
+
+def _get_penetration_depth(mesh1: bpy.types.Mesh, matrix1: np.ndarray, mesh2: bpy.types.Mesh,
+                           matrix2: np.ndarray) -> float:
+    """Max distance from the vertices of each mesh lying inside the other mesh to its surface, in world units"""
+    depth = 0.0
+    for mesh_a, matrix_a, mesh_b, matrix_b in [(mesh1, matrix1, mesh2, matrix2), (mesh2, matrix2, mesh1, matrix1)]:
+        vertices, _ = _get_cached_mesh_arrays(mesh_a)
+        vertices_b, _ = _get_cached_mesh_arrays(mesh_b)
+        if len(vertices) == 0 or len(vertices_b) == 0:
+            return 0.0
+        relative = np.linalg.inv(matrix_b).dot(matrix_a)
+        vertices = vertices.dot(relative[:3, :3].T) + relative[:3, 3]
+        inside_box = np.all((vertices >= vertices_b.min(axis=0)) & (vertices <= vertices_b.max(axis=0)), axis=1)
+        scale = np.max(np.linalg.norm(matrix_b[:3, :3], axis=0))
+        bvh_tree = _get_local_bvh_tree(mesh_b)
+        for vertex in vertices[inside_box]:
+            location, normal, _, distance = bvh_tree.find_nearest(vertex)
+            if location is not None and (Vector(vertex) - location).dot(normal) < 0:
+                depth = max(depth, distance * scale)
+    return depth
+
+
+def _get_interpenetration_ratio() -> float:
+    """Ratio of active objects penetrating another active object deeper than the tolerance at the current frame.
+    Passive objects and physics proxies are skipped, resting contacts within the tolerance are not counted"""
+    active_objects = [obj for obj in get_all_mesh_objects()
+                      if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE']
+    if len(active_objects) < 2:
+        return 0.0
+    bounds = np.array([_get_world_bound_box(obj) for obj in active_objects])
+    overlap = np.all((bounds[:, np.newaxis, 0] <= bounds[np.newaxis, :, 1]) &
+                     (bounds[np.newaxis, :, 0] <= bounds[:, np.newaxis, 1]), axis=-1)
+    penetrated = np.zeros(len(active_objects), dtype=bool)
+    for i, j in zip(*np.nonzero(np.triu(overlap, k=1))):
+        obj1, obj2 = active_objects[i], active_objects[j]
+        tolerance = max(_PENETRATION_TOLERANCE_MARGINS * (obj1.rigid_body.collision_margin +
+                                                          obj2.rigid_body.collision_margin),
+                        _PENETRATION_TOLERANCE_RATIO * min(min(obj1.dimensions), min(obj2.dimensions)))
+        depth = _get_penetration_depth(obj1.data, np.array(obj1.matrix_world), obj2.data, np.array(obj2.matrix_world))
+        if depth > tolerance:
+            penetrated[i] = penetrated[j] = True
+    return np.count_nonzero(penetrated) / len(active_objects)
+
+
+def _restart_simulation_at(frame: int):
+    """Free the bake and restart the simulation at frame from the poses of active objects at that frame, their
+    velocities are reset"""
+    point_cache = bpy.context.scene.rigidbody_world.point_cache
+    bpy.context.scene.frame_set(frame)
+    poses = {obj.name: obj.matrix_world.copy() for obj in get_all_mesh_objects()
+             if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE'}
+    bpy.ops.ptcache.free_bake({"point_cache": point_cache})
+    point_cache.frame_start = frame
+    for name, matrix_world in poses.items():
+        bpy.data.objects[name].matrix_world = matrix_world
+    bpy.context.scene.frame_set(frame)
 
 
 def _have_objects_stopped_moving(last_poses: dict, new_poses: dict, object_stopped_location_threshold: float,
@@ -124,7 +237,8 @@ def _have_objects_stopped_moving(last_poses: dict, new_poses: dict, object_stopp
 
 
 def _bake_physics_simulation(min_simulation_time: float, max_simulation_time: float, check_object_interval: float,
-                             object_stopped_location_threshold: float, object_stopped_rotation_threshold: float):
+                             object_stopped_location_threshold: float, object_stopped_rotation_threshold: float,
+                             adaptive_substeps: bool = False):
     # Run simulation
     point_cache = bpy.context.scene.rigidbody_world.point_cache
     point_cache.frame_start = 1
@@ -133,6 +247,7 @@ def _bake_physics_simulation(min_simulation_time: float, max_simulation_time: fl
         raise Exception("max_simulation_iterations has to be bigger than min_simulation_iterations")
 
     # Run simulation starting from min to max in the configured steps
+    last_checked_frame = point_cache.frame_start
     for current_time in np.arange(min_simulation_time, max_simulation_time, check_object_interval):
         current_frame = seconds_to_frames(current_time)
         print("Running simulation up to " + str(current_time) + " seconds (" + str(current_frame) + " frames)")
@@ -149,6 +264,23 @@ def _bake_physics_simulation(min_simulation_time: float, max_simulation_time: fl
         bpy.context.scene.frame_set(current_frame)
         new_poses = _get_active_objects_pose()
 
+        # Rerun the interval in which objects started to penetrate each other with more substeps, at most once
+        rigidbody_world = bpy.context.scene.rigidbody_world
+        if adaptive_substeps and rigidbody_world.substeps_per_frame < _MAX_AUTO_SUBSTEPS:
+            ratio = _get_interpenetration_ratio()
+            if ratio > _MAX_INTERPENETRATION_RATIO:
+                adaptive_substeps = False
+                rigidbody_world.substeps_per_frame = min(rigidbody_world.substeps_per_frame * 2, _MAX_AUTO_SUBSTEPS)
+                print('{:.0%} objects penetrate, rerun simulation from frame {} with {} substeps per frame'.format(
+                    ratio, last_checked_frame, rigidbody_world.substeps_per_frame))
+                _restart_simulation_at(last_checked_frame)
+                bpy.ops.ptcache.bake({"point_cache": point_cache}, bake=True)
+                bpy.context.scene.frame_set(current_frame - seconds_to_frames(1))
+                old_poses = _get_active_objects_pose()
+                bpy.context.scene.frame_set(current_frame)
+                new_poses = _get_active_objects_pose()
+        last_checked_frame = current_frame
+
         # If objects have stopped moving between the last two frames, then stop here
         if _have_objects_stopped_moving(old_poses, new_poses, object_stopped_location_threshold,
                                         object_stopped_rotation_threshold):
@@ -162,8 +294,38 @@ def _bake_physics_simulation(min_simulation_time: float, max_simulation_time: fl
             bpy.ops.ptcache.free_bake({"point_cache": point_cache})
 
 
+def _get_wake_up_objects(removed_bounds: List[np.ndarray], margin: float) -> set:
+    """Find the physics objects in the contact neighbourhood of the removed objects by bounding box adjacency"""
+    candidates = [obj for obj in get_all_mesh_objects() if obj.get('physics', False)]
+    if not candidates:
+        return set()
+    bounds = np.array([_get_world_bound_box(obj) for obj in candidates])
+    mins, maxs = bounds[:, 0], bounds[:, 1]
+
+    awake = np.zeros(len(candidates), dtype=bool)
+    frontier_mins = np.array([bound[0] for bound in removed_bounds])
+    frontier_maxs = np.array([bound[1] for bound in removed_bounds])
+    first_ring = True
+    while len(frontier_mins) > 0:
+        touching = np.all((mins[:, np.newaxis] <= frontier_maxs[np.newaxis] + margin) &
+                          (maxs[:, np.newaxis] >= frontier_mins[np.newaxis] - margin), axis=-1)
+        if not first_ring:
+            # beyond the removed objects, only the objects resting on a woken object can lose their support
+            touching &= (mins[:, np.newaxis, 2] + maxs[:, np.newaxis, 2]) > \
+                        (frontier_mins[np.newaxis, :, 2] + frontier_maxs[np.newaxis, :, 2])
+        new_awake = np.any(touching, axis=1) & ~awake
+        awake |= new_awake
+        frontier_mins, frontier_maxs = mins[new_awake], maxs[new_awake]
+        first_ring = False
+
+    print('Local wake up: {} of {} objects are active'.format(np.sum(awake), len(candidates)))
+    return set(candidates[i].name for i in np.nonzero(awake)[0])
+
+
 def physics_simulation(min_simulation_time: float = 1.0, max_simulation_time: float = 10.0,
-                       substeps_per_frame: int = 10, max_faces: int = 500):
+                       substeps_per_frame: Union[int, str] = 10, max_faces: int = 500,
+                       local_wake_up: bool = False, wake_up_margin: float = 0.01,
+                       solver_iterations: Union[int, str] = 10) -> dict:
     """Run physics simulation for a few seconds then freeze the scene. Simulation will stop automatically if the object
     is no longer moving or if the *max_simulation_time* has been reached
 
@@ -172,54 +334,96 @@ def physics_simulation(min_simulation_time: float = 1.0, max_simulation_time: fl
     :param max_simulation_time: the simulation will at most run *max_simulation_time* seconds
     :type max_simulation_time: float
     :param substeps_per_frame: number of substeps to solve physics computation per frame, higher value for more stable
-        simulation
-    :type substeps_per_frame: int
-    :param max_faces: reduce the number of faces to speed up collision checking, only works in physics simulation
+        simulation. If "AUTO", it is chosen from the smallest object dimension, the fall velocity and the collision
+        margins. It is doubled once if objects are found penetrating each other deeper than a tolerance at a check
+        interval, and the simulation is rerun from the previous check with the poses of that frame
+    :type substeps_per_frame: int or str
+    :param max_faces: reduce the number of faces to speed up collision checking. Rigid bodies are simulated with a
+        decimated copy of their meshes centered at the center of mass, created once per mesh, the meshes used for
+        rendering are not modified
     :type max_faces: int
+    :param local_wake_up: only simulate the objects around the objects picked by ``remove_highest_mesh_object(s)``
+        since the last simulation, all other objects stay still. Objects removed by other functions, e.g.
+        ``remove_mesh_objects_out_box``, do not wake up their neighbours. If no object has been picked, all objects
+        with custom properties "physics = True" will be simulated
+    :type local_wake_up: bool
+    :param wake_up_margin: objects whose bounding boxes are closer than this distance are considered in contact
+    :type wake_up_margin: float
+    :param solver_iterations: number of constraint solver iterations per substep. If "AUTO", it grows with the number
+        of simulated objects
+    :type solver_iterations: int or str
+    :return: the simulation settings actually used, keys: substeps_per_frame, solver_iterations
+    :rtype: dict
     """
-    # enable rigid body
-    for obj in get_all_mesh_objects():
-        physics_type = 'ACTIVE' if obj.get('physics', False) else 'PASSIVE'
+    removed_bounds = _pop_removed_bounds()
+    awake_objects = None
+    if local_wake_up and removed_bounds:
+        awake_objects = _get_wake_up_objects(removed_bounds, wake_up_margin)
+
+    frame_current = bpy.context.scene.frame_current
+    swapped = _swap_physics_meshes(max_faces)
+
+    # enable rigid body, objects with physics proxy are replaced by their proxies
+    for obj in get_all_mesh_objects(include_physics_proxies=True):
+        if obj.get('use_physics_proxy', False):
+            continue
+        is_awake = awake_objects is None or obj.name in awake_objects
+        physics_type = 'ACTIVE' if obj.get('physics', False) and is_awake else 'PASSIVE'
         physics_collision_shape = obj.get('collision_shape', 'CONVEX_HULL')
         physics_collision_margin = obj.get('collision_margin', 0.0001)
+        if physics_collision_shape == 'CONVEX_DECOMPOSITION':
+            if 'convex_decomposition' not in obj.data:
+                convex_decompose_mesh_object(obj.name, obj.get('convex_pieces', 16))
+            physics_collision_shape = 'COMPOUND'
         _enable_rigid_body(obj, physics_type, physics_collision_shape, physics_collision_margin)
 
-    bpy.ops.ed.undo_push(message='before simulation')
-    if max_faces is not None:
-        all_mesh_data = set()
-        for obj in get_all_mesh_objects():
-            if obj.data.name not in all_mesh_data:
-                all_mesh_data.add(obj.data.name)
-                decimate_mesh_object(obj.name, max_faces)
-    obj_poses_before_sim = _get_active_objects_pose()
-    origin_shifts = _simulation(min_simulation_time, max_simulation_time, substeps_per_frame=substeps_per_frame)
-    obj_poses_after_sim = _get_active_objects_pose()
+    piece_names = []
+    for obj in get_all_mesh_objects():
+        if obj.rigid_body is not None and obj.rigid_body.collision_shape == 'COMPOUND':
+            piece_names += _add_convex_pieces(obj)
+    active_objects = [obj for obj in get_all_mesh_objects()
+                      if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE']
+    adaptive_substeps = str(substeps_per_frame).upper() == 'AUTO'
+    if adaptive_substeps:
+        substeps_per_frame = _auto_substeps_per_frame(active_objects)
+    if str(solver_iterations).upper() == 'AUTO':
+        solver_iterations = _auto_solver_iterations(active_objects)
+    print('Physics simulation: {} substeps per frame, {} solver iterations'.format(substeps_per_frame,
+                                                                                    solver_iterations))
+
+    _simulation(min_simulation_time, max_simulation_time, substeps_per_frame=substeps_per_frame,
+                solver_iters=solver_iterations, adaptive_substeps=adaptive_substeps)
+    poses_after_sim = {obj.name: obj.matrix_world.copy() for obj in active_objects}
+    report = dict(substeps_per_frame=bpy.context.scene.rigidbody_world.substeps_per_frame,
+                  solver_iterations=bpy.context.scene.rigidbody_world.solver_iterations)
     bpy.ops.ptcache.free_bake({"point_cache": bpy.context.scene.rigidbody_world.point_cache})
-    bpy.ops.ed.undo_push(message='after simulation')
-    bpy.ops.ed.undo()
-
-    # Fix the pose of all objects to their pose at the and of the simulation (also revert origin shift)
-    objects_with_physics = [obj for obj in get_all_mesh_objects() if obj.rigid_body is not None]
-    for obj in objects_with_physics:
-        # Skip objects that have parents with compound rigid body component
-        if obj.rigid_body.type == "ACTIVE":
-            # compute relative object rotation before and after simulation
-            R_obj_before_sim = Euler(obj_poses_before_sim[obj.name]['rotation']).to_matrix()
-            R_obj_after = Euler(obj_poses_after_sim[obj.name]['rotation']).to_matrix()
-            R_obj_rel = R_obj_before_sim @ R_obj_after.transposed()
-            # Apply relative rotation to origin shift
-            origin_shift = R_obj_rel.transposed() @ origin_shifts[obj.name]
-            # Fix pose of object to the one it had at the end of the simulation
-            obj.location = obj_poses_after_sim[obj.name]['location'] - origin_shift
-            obj.rotation_euler = obj_poses_after_sim[obj.name]['rotation']
+    bpy.context.scene.frame_set(frame_current)
+
+    # remove the convex pieces, restore the render meshes and fix the pose of all objects to their pose at the end
+    # of the simulation (also revert origin shift)
+    for name in piece_names:
+        bpy.data.objects.remove(bpy.data.objects[name])
+    _unregister_objects(piece_names)
+    for name, (mesh, matrix_world, center) in swapped.items():
+        obj = bpy.data.objects[name]
+        obj.data = mesh
+        obj.matrix_world = matrix_world
+    for obj in active_objects:
+        center = swapped[obj.name][2] if obj.name in swapped else Vector((0, 0, 0))
+        obj.matrix_world = poses_after_sim[obj.name] @ Matrix.Translation(-center)
 
     # unset rigid bodys
-    for obj in get_all_mesh_objects():
-        _disable_rigid_body(obj)
+    for obj in get_all_mesh_objects(include_physics_proxies=True):
+        if obj.rigid_body is not None:
+            _disable_rigid_body(obj)
+
+    print('Physics simulation finished: {}'.format(report))
+    return report
 
 
-def _check_no_collision(obj: bpy.types.Object, bvh_cache: dict = None):
-    objects_to_check_against = get_all_mesh_objects()
+def _check_no_collision(obj: bpy.types.Object, objects_to_check_against: List[bpy.types.Object] = None) -> bool:
+    if objects_to_check_against is None:
+        objects_to_check_against = get_all_mesh_objects()
 
     no_collision = True
     for collision_obj in objects_to_check_against:
@@ -227,47 +431,49 @@ def _check_no_collision(obj: bpy.types.Object, bvh_cache: dict = None):
             continue
         intersection = _check_bb_intersection(obj, collision_obj)
         if intersection:
-            intersection, bvh_cache = _check_mesh_intersection(obj, collision_obj, bvh_cache)
+            intersection = _check_mesh_intersection(obj, collision_obj)
         if intersection:
             no_collision = False
             break
-    return no_collision, bvh_cache
+    return no_collision
 
 
 def _get_bound_box(obj: bpy.types.Object):
     return [obj.matrix_world @ Vector(cord) for cord in obj.bound_box]
 
 
-def _create_bvh_tree(obj: bpy.types.Object) -> mathutils.bvhtree.BVHTree:
-    bm = bmesh.new()
-    bm.from_mesh(obj.data)
-    bm.transform(obj.matrix_world)
-    bvh_tree = mathutils.bvhtree.BVHTree.FromBMesh(bm)
-    bm.free()
-    return bvh_tree
+def _get_local_bvh_tree(mesh: bpy.types.Mesh) -> BVHTree:
+    """BVH tree of mesh in its local coordinates, cached per mesh datablock for the life of the scene"""
+    entry = _get_mesh_cache(mesh)
+    if 'bvh_tree' not in entry:
+        vertices, triangles = _get_cached_mesh_arrays(mesh)
+        entry['bvh_tree'] = BVHTree.FromPolygons(vertices.tolist(), triangles.tolist())
+    return entry['bvh_tree']
 
 
-def _check_mesh_intersection(obj1: bpy.types.Object, obj2: bpy.types.Object, bvh_cache: dict = None):
-    if bvh_cache is None:
-        bvh_cache = {}
+def _build_world_bvh_tree(mesh: bpy.types.Mesh, matrix: np.ndarray) -> BVHTree:
+    """BVH tree of mesh transformed by a world matrix"""
+    vertices, triangles = _get_cached_mesh_arrays(mesh)
+    vertices = vertices.dot(matrix[:3, :3].T) + matrix[:3, 3]
+    return BVHTree.FromPolygons(vertices.tolist(), triangles.tolist())
 
-    if len(obj1.data.vertices) == 0 or len(obj2.data.vertices) == 0:
-        return False, bvh_cache
 
-    if obj1.name not in bvh_cache:
-        obj1_bvhtree = _create_bvh_tree(obj1)
-        bvh_cache[obj1.name] = obj1_bvhtree
-    else:
-        obj1_bvhtree = bvh_cache[obj1.name]
+def _get_world_bvh_tree(obj: bpy.types.Object) -> BVHTree:
+    """BVH tree of object in world coordinates, cached in the entry of its mesh per object until the object moves,
+    so linked duplicates have a tree each"""
+    matrix = np.array(obj.matrix_world)
+    trees = _get_mesh_cache(obj.data).setdefault('world_bvh_trees', {})
+    cached = trees.get(obj.name, None)
+    if cached is None or not np.array_equal(cached[0], matrix):
+        cached = (matrix, _build_world_bvh_tree(obj.data, matrix))
+        trees[obj.name] = cached
+    return cached[1]
 
-    if obj2.name not in bvh_cache:
-        obj2_bvhtree = _create_bvh_tree(obj2)
-        bvh_cache[obj2.name] = obj2_bvhtree
-    else:
-        obj2_bvhtree = bvh_cache[obj2.name]
 
-    inter = len(obj1_bvhtree.overlap(obj2_bvhtree)) > 0
-    return inter, bvh_cache
+def _check_mesh_intersection(obj1: bpy.types.Object, obj2: bpy.types.Object) -> bool:
+    if len(obj1.data.vertices) == 0 or len(obj2.data.vertices) == 0:
+        return False
+    return len(_get_world_bvh_tree(obj1).overlap(_get_world_bvh_tree(obj2))) > 0
 
 
 def _check_bb_intersection(obj1: bpy.types.Object, obj2: bpy.types.Object):
@@ -287,7 +493,177 @@ def _check_bb_intersection(obj1: bpy.types.Object, obj2: bpy.types.Object):
     return intersection
 
 
-def collision_free_positioning(obj_name: str, pose_sampler: Callable, max_trials: int = 100):
+class _UniformGrid:
+    """Broad phase index of world space bounding boxes in a uniform grid, boxes spanning too many cells (e.g. ground
+    plane and tote) are kept aside and always returned as candidates"""
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells = {}  # key=cell index, value=set of object names
+        self.entries = {}  # key=object name, value=(bounds, stamp, cell indices)
+        self.large_objects = set()
+
+    def _cell_indices(self, bounds: np.ndarray) -> list:
+        lo = np.floor(bounds[0] / self.cell_size).astype(np.int64)
+        hi = np.floor(bounds[1] / self.cell_size).astype(np.int64)
+        if np.prod(hi - lo + 1) > _MAX_CELLS_PER_OBJECT:
+            return None
+        return [(i, j, k) for i in range(lo[0], hi[0] + 1) for j in range(lo[1], hi[1] + 1)
+                for k in range(lo[2], hi[2] + 1)]
+
+    def insert(self, name: str, bounds: np.ndarray, stamp: np.ndarray):
+        self.remove(name)
+        indices = self._cell_indices(bounds)
+        if indices is None:
+            self.large_objects.add(name)
+        else:
+            for index in indices:
+                self.cells.setdefault(index, set()).add(name)
+        self.entries[name] = (bounds, stamp, indices)
+
+    def remove(self, name: str):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        if entry[2] is None:
+            self.large_objects.discard(name)
+        else:
+            for index in entry[2]:
+                self.cells[index].discard(name)
+                if not self.cells[index]:
+                    del self.cells[index]
+
+    def query(self, bounds: np.ndarray) -> List[str]:
+        """return names of objects whose bounding boxes intersect with the given bounds"""
+        indices = self._cell_indices(bounds)
+        if indices is None:
+            names = set(self.entries.keys())
+        else:
+            names = set(self.large_objects)
+            for index in indices:
+                names.update(self.cells.get(index, ()))
+        ret = []
+        for name in names:
+            other = self.entries[name][0]
+            if np.all(other[1] >= bounds[0]) and np.all(bounds[1] >= other[0]):
+                ret.append(name)
+        return ret
+
+
+# broad phase index of mesh objects owned by collision_free_positioning, it is kept in sync with the scene lazily
+_broad_phase = None
+
+
+def _get_bound_stamp(obj: bpy.types.Object) -> np.ndarray:
+    return np.concatenate([np.array(obj.matrix_world).ravel(), np.array(obj.bound_box).ravel()])
+
+
+def _sync_broad_phase(obj: bpy.types.Object) -> _UniformGrid:
+    """Update the entries of moved, removed and new objects, the grid is rebuilt if the scene has been reset"""
+    global _broad_phase
+    mesh_objects = get_all_mesh_objects()
+    names = set(o.name for o in mesh_objects)
+    if _broad_phase is None or not names.intersection(_broad_phase.entries.keys()):
+        _broad_phase = _UniformGrid(cell_size=max(max(obj.dimensions), 1e-3))
+    for name in list(_broad_phase.entries.keys()):
+        if name not in names:
+            _broad_phase.remove(name)
+    for o in mesh_objects:
+        stamp = _get_bound_stamp(o)
+        entry = _broad_phase.entries.get(o.name, None)
+        if entry is None or not np.array_equal(entry[1], stamp):
+            _broad_phase.insert(o.name, _get_world_bound_box(o), stamp)
+    return _broad_phase
+
+
+def _euler_to_matrix(eulers: np.ndarray) -> np.ndarray:
+    """convert (N, 3) XYZ euler angles in radians to (N, 3, 3) rotation matrices, same as mathutils.Euler"""
+    cx, cy, cz = np.cos(eulers).T
+    sx, sy, sz = np.sin(eulers).T
+    return np.stack([
+        np.stack([cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz], axis=-1),
+        np.stack([cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz], axis=-1),
+        np.stack([-sy, sx * cy, cx * cy], axis=-1)], axis=1)
+
+
+def _get_local_bounding_sphere(mesh: bpy.types.Mesh) -> (np.ndarray, float):
+    entry = _get_mesh_cache(mesh)
+    if 'bounding_sphere' not in entry:
+        vertices, _ = _get_cached_mesh_arrays(mesh)
+        center = (vertices.min(axis=0) + vertices.max(axis=0)) / 2 if len(vertices) else np.zeros(3)
+        radius = np.max(np.linalg.norm(vertices - center, axis=-1)) if len(vertices) else 0.0
+        entry['bounding_sphere'] = (center, radius)
+    return entry['bounding_sphere']
+
+
+def _sample_poses(pose_sampler: Callable, num: int) -> (np.ndarray, np.ndarray):
+    """draw a batch of poses in one call if the sampler has the attribute "batch = True", otherwise call it *num*
+    times"""
+    if getattr(pose_sampler, 'batch', False):
+        positions, eulers = pose_sampler(num)
+    else:
+        positions, eulers = zip(*[pose_sampler() for _ in range(num)])
+    return np.asarray(positions, dtype=np.float64).reshape(-1, 3), np.asarray(eulers, dtype=np.float64).reshape(-1, 3)
+
+
+def _batch_positioning(obj: bpy.types.Object, grid: _UniformGrid, pose_sampler: Callable, max_trials: int,
+                       batch_size: int, num_exact_checks: int) -> bool:
+    """Candidates are only ranked by the overlap of bounding spheres with the spheres of placed objects, none is
+    discarded before the exact checks since overlapping bounding spheres do not imply a collision. Large objects,
+    e.g. the tote and the ground, are not part of the ranking, the pose sampler should keep poses inside the walls"""
+    center, radius = _get_local_bounding_sphere(obj.data)
+    radius = radius * max(obj.scale)
+    scale = np.array(obj.scale)
+    local_corners = np.array(obj.bound_box)
+
+    # placed objects indexed in cells are approximated by the spheres around their bounding boxes
+    small_names = [name for name, entry in grid.entries.items() if entry[2] is not None]
+    small_bounds = np.array([grid.entries[name][0] for name in small_names]).reshape(-1, 2, 3)
+    small_centers = (small_bounds[:, 0] + small_bounds[:, 1]) / 2
+    small_radii = np.linalg.norm(small_bounds[:, 1] - small_bounds[:, 0], axis=-1) / 2
+
+    num_trials = 0
+    while num_trials < max_trials:
+        num = min(batch_size, max_trials - num_trials)
+        positions, eulers = _sample_poses(pose_sampler, num)
+        rotations = _euler_to_matrix(eulers) * scale
+        world_centers = rotations.dot(center) + positions
+
+        # rank candidates by the penetration of their bounding spheres, non-overlapping spheres first
+        dists = np.linalg.norm(world_centers[:, np.newaxis] - small_centers[np.newaxis], axis=-1)
+        penetration = np.max(radius + small_radii[np.newaxis] - dists, axis=1, initial=0)
+        for index in np.argsort(penetration, kind='stable')[:num_exact_checks]:
+            num_trials += 1
+            matrix = np.eye(4)
+            matrix[:3, :3] = rotations[index]
+            matrix[:3, 3] = positions[index]
+            corners = local_corners.dot(rotations[index].T) + positions[index]
+            bounds = np.array([corners.min(axis=0), corners.max(axis=0)])
+            no_collision = True
+            bvh_tree = None
+            for name in grid.query(bounds):
+                other = bpy.data.objects[name]
+                if len(obj.data.vertices) == 0 or len(other.data.vertices) == 0:
+                    continue
+                if bvh_tree is None:
+                    bvh_tree = _build_world_bvh_tree(obj.data, matrix)
+                if len(bvh_tree.overlap(_get_world_bvh_tree(other))) > 0:
+                    no_collision = False
+                    break
+            if no_collision:
+                obj.location = positions[index]
+                obj.rotation_euler = eulers[index]
+                bpy.context.view_layer.update()
+                grid.insert(obj.name, _get_world_bound_box(obj), _get_bound_stamp(obj))
+                print('Successfully positioning object in {} exact checks'.format(num_trials))
+                return True
+        num_trials += num - min(num, num_exact_checks)
+    print('Failed to avoid collision when positioning')
+    return False
+
+
+def collision_free_positioning(obj_name: str, pose_sampler: Callable, max_trials: int = 100,
+                               batch_size: int = None, num_exact_checks: int = 8):
     """Placing an object in a collision free position
 
     :param obj_name: the name of object to be placed
@@ -296,20 +672,32 @@ def collision_free_positioning(obj_name: str, pose_sampler: Callable, max_trials
     :type pose_sampler: function
     :param max_trials: max number of trials
     :type max_trials: int
+    :param batch_size: if not None, draw this number of poses at once, rank them by the overlap of bounding spheres
+        with placed objects and only run exact collision checks on the best *num_exact_checks* poses. Candidates are
+        ranked but never discarded by the spheres, and walls of large objects such as the tote are not considered in
+        the ranking. Samplers with the attribute ``batch = True``, e.g. ``in_tote_sampler``, are called with a number
+        and generate the whole batch in one numpy call
+    :type batch_size: int
+    :param num_exact_checks: number of exact collision checks per batch
+    :type num_exact_checks: int
     :return: True if no collision
     :rtype: bool
     """
-    bvh_cache = None
     obj = get_object_by_name(obj_name)
+    grid = _sync_broad_phase(obj)
+    grid.remove(obj.name)
+    if batch_size is not None:
+        return _batch_positioning(obj, grid, pose_sampler, max_trials, batch_size, num_exact_checks)
     for i in range(max_trials):
         pos, euler = pose_sampler()
         obj.location = pos
         obj.rotation_euler = euler
-        if bvh_cache and obj.name in bvh_cache:
-            del bvh_cache[obj.name]
         bpy.context.view_layer.update()
-        no_collision, bvh_cache = _check_no_collision(obj, bvh_cache)
+        bounds = _get_world_bound_box(obj)
+        candidates = [bpy.data.objects[name] for name in grid.query(bounds)]
+        no_collision = _check_no_collision(obj, candidates)
         if no_collision:
+            grid.insert(obj.name, bounds, _get_bound_stamp(obj))
             print('Successfully positioning object in {} trials'.format(i + 1))
             return True
     print('Failed to avoid collision when positioning')
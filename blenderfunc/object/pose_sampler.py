@@ -1,40 +1,80 @@
 import bpy
 import math
 import numpy as np
-from mathutils import Vector, Euler, Matrix
+from mathutils import Vector, Matrix
 from typing import Callable, List
 from blenderfunc.utility.utility import get_object_by_name
+from blenderfunc.object.meshes import mesh_stats, _get_cached_hull_vertices, _get_cached_mesh_arrays
+from blenderfunc.object.physics import _euler_to_matrix
 
 
-def _min_max_sampler(range1: List[float] = None, range2: List[float] = None, range3: List[float] = None):
-    if range1 is None:
-        range1 = [0, 0]
-    if range2 is None:
-        range2 = [0, 0]
-    if range3 is None:
-        range3 = [0, 0]
-    ret = (np.random.rand() * (range1[1] - range1[0]) + range1[0],
-           np.random.rand() * (range2[1] - range2[0]) + range2[0],
-           np.random.rand() * (range3[1] - range3[0]) + range3[0])
+_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19]
+
+
+def _halton(indices: np.ndarray, dims: int) -> np.ndarray:
+    """points of the halton sequence at the given indices, (N, dims) array in [0, 1)"""
+    ret = np.zeros((len(indices), dims))
+    for d in range(dims):
+        base = _PRIMES[d]
+        i = np.array(indices, dtype=np.int64)
+        f = 1.0
+        while np.any(i > 0):
+            f /= base
+            ret[:, d] += f * (i % base)
+            i //= base
     return ret
 
 
-def in_tote_sampler(tote_name: str, obj_name: str, num: int) -> Callable:
+def _low_discrepancy_sequence(dims: int, sequence: str = 'halton') -> Callable:
+    """Return a function drawing the next n points of a randomly shifted halton sequence in [0, 1)^dims, the random
+    shift makes every sampler different while keeping the low discrepancy. Use sequence="random" for i.i.d. points"""
+    sequence = sequence.lower()
+    if sequence not in ['halton', 'random']:
+        raise Exception('Unknown sequence: {}'.format(sequence))
+    shift = np.random.rand(dims)
+    state = {'index': 1}
+
+    def draw(num: int) -> np.ndarray:
+        if sequence == 'random':
+            return np.random.rand(num, dims)
+        indices = np.arange(state['index'], state['index'] + num)
+        state['index'] += num
+        return (_halton(indices, dims) + shift) % 1.0
+
+    return draw
+
+
+def _uniform_rotation_eulers(u: np.ndarray) -> np.ndarray:
+    """map (N, 3) points in [0, 1)^3 to XYZ euler angles in radians of rotations uniformly distributed over SO(3),
+    via uniform quaternions (Shoemake)"""
+    r1, r2 = np.sqrt(1 - u[:, 0]), np.sqrt(u[:, 0])
+    t1, t2 = 2 * math.pi * u[:, 1], 2 * math.pi * u[:, 2]
+    x, y, z, w = r1 * np.sin(t1), r1 * np.cos(t1), r2 * np.sin(t2), r2 * np.cos(t2)
+    r00 = 1 - 2 * (y * y + z * z)
+    r10 = 2 * (x * y + z * w)
+    r20 = 2 * (x * z - y * w)
+    r21 = 2 * (y * z + x * w)
+    r22 = 1 - 2 * (x * x + y * y)
+    return np.stack([np.arctan2(r21, r22), np.arcsin(np.clip(-r20, -1, 1)), np.arctan2(r10, r00)], axis=-1)
+
+
+def in_tote_sampler(tote_name: str, obj_name: str, num: int, sequence: str = 'halton') -> Callable:
     """Return a random pose sampler that only generates poses above the tote, which ensures the objects will
-    fall inside the tote eventually after physics simulation.
+    fall inside the tote eventually after physics simulation. Rotations are uniformly distributed over SO(3)
 
     :param tote_name: name of tote
     :param obj_name: name of object
     :param num: number of objects that will be in the tote
-    :return: random pose sampler
+    :param sequence: "halton" for low-discrepancy poses which cover the space with fewer trials, or "random"
+    :return: random pose sampler, call it without arguments to get one (location, euler), or with a number *n* to get
+        two (n, 3) arrays
     :rtype: function
     """
     tote = get_object_by_name(tote_name)
     obj = get_object_by_name(obj_name)
     length, width, height = tote.dimensions
     obj_volume = obj.dimensions[0] * obj.dimensions[1] * obj.dimensions[2]
-    pts = np.array([vertex.co for vertex in obj.data.vertices])
-    max_dist = np.max(np.linalg.norm(pts, axis=-1))
+    max_dist = mesh_stats(obj_name)['bounding_radius'] * max(obj.scale)
     x_min = -length / 2 + max_dist
     x_max = length / 2 - max_dist
     y_min = -width / 2 + max_dist
@@ -45,14 +85,119 @@ def in_tote_sampler(tote_name: str, obj_name: str, num: int) -> Callable:
     volume = 10 * num * obj_volume
     z_max = z_min + volume / ((x_max - x_min) * (y_max - y_min))
 
-    def sampler():
-        pos = _min_max_sampler([x_min, x_max], [y_min, y_max], [z_min, z_max])
-        euler = _min_max_sampler([0, 360], [0, 360], [0, 360])
-        return pos, euler
+    draw = _low_discrepancy_sequence(6, sequence)
 
+    def sampler(num: int = None):
+        u = draw(1 if num is None else num)
+        positions = u[:, :3] * [x_max - x_min, y_max - y_min, z_max - z_min] + [x_min, y_min, z_min]
+        eulers = _uniform_rotation_eulers(u[:, 3:])
+        if num is None:
+            return tuple(positions[0]), tuple(eulers[0])
+        return positions, eulers
+
+    sampler.batch = True
     return sampler
 
 
+def _get_tote_inner_box(tote: bpy.types.Object) -> (np.ndarray, np.ndarray):
+    """return the world space min and max corners of the inner space of tote, height is not limited"""
+    if 'tote_size' in tote:
+        length, width, height, thickness = tote['tote_size']
+    else:
+        (length, width, height), thickness = tote.dimensions, 0.0
+    location = np.array(tote.matrix_world.translation)
+    box_min = location + [-length / 2, -width / 2, thickness]
+    box_max = location + [length / 2, width / 2, float('inf')]
+    return box_min, box_max
+
+
+def _lattice_packing(box_min: np.ndarray, box_max: np.ndarray, diameter: float, num: int) -> np.ndarray:
+    """hexagonal close packing of spheres layer by layer from the bottom of the box"""
+    row_step = diameter * math.sqrt(3) / 2
+    layer_step = diameter * math.sqrt(2 / 3)
+    positions = []
+    layer = 0
+    while len(positions) < num:
+        # odd layers sit in the hollows of the layer below
+        offset_x = diameter / 2 if layer % 2 else 0.0
+        offset_y = diameter * math.sqrt(3) / 6 if layer % 2 else 0.0
+        ys = np.arange(box_min[1] + offset_y, box_max[1] + 1e-9, row_step)
+        layer_positions = []
+        for row, y in enumerate(ys):
+            x_start = box_min[0] + offset_x + (diameter / 2 if row % 2 else 0.0)
+            xs = np.arange(x_start, box_max[0] + 1e-9, diameter)
+            layer_positions.extend([(x, y, box_min[2] + layer * layer_step) for x in xs])
+        if not layer_positions:
+            if layer % 2 == 0:
+                break
+        else:
+            np.random.shuffle(layer_positions)
+            positions.extend(layer_positions)
+        layer += 1
+    return np.array(positions[:num]).reshape(-1, 3)
+
+
+def _poisson_disk_packing(box_min: np.ndarray, box_max: np.ndarray, diameter: float, num: int,
+                          batch_size: int = 1024) -> np.ndarray:
+    """random dart throwing with minimum distance, the sampled slab grows upwards whenever it is full"""
+    slab_height = diameter
+    positions = np.zeros((0, 3))
+    while len(positions) < num:
+        candidates = np.random.rand(batch_size, 3) * [box_max[0] - box_min[0], box_max[1] - box_min[1], slab_height]
+        candidates += box_min
+        num_before = len(positions)
+        for candidate in candidates:
+            if len(positions) == 0 or np.min(np.linalg.norm(positions - candidate, axis=-1)) >= diameter:
+                positions = np.vstack([positions, candidate])
+                if len(positions) == num:
+                    break
+        if len(positions) - num_before < batch_size * 0.01:
+            slab_height += diameter
+    return positions
+
+
+def in_tote_layout(tote_name: str, obj_name: str, num: int, method: str = 'lattice', gap: float = 0.0) -> List[tuple]:
+    """Generate non-overlapping initial poses for *num* copies of an object inside the tote. The bounding spheres of
+    objects are packed from the bottom of the tote, so objects are spawned as low as possible and no collision check
+    is needed among them
+
+    :param tote_name: name of tote
+    :type tote_name: str
+    :param obj_name: name of object
+    :type obj_name: str
+    :param num: number of poses
+    :type num: int
+    :param method: packing method, "lattice" (hexagonal close packing, densest) or "poisson" (random poisson disk)
+    :type method: str
+    :param gap: extra distance between the bounding spheres of objects
+    :type gap: float
+    :return: list of (location, euler)
+    :rtype: List of tuples
+    """
+    tote = get_object_by_name(tote_name)
+    obj = get_object_by_name(obj_name)
+    radius = mesh_stats(obj_name)['bounding_radius'] * max(obj.scale)
+
+    box_min, box_max = _get_tote_inner_box(tote)
+    box_min = box_min + radius
+    box_max = box_max - radius
+    if box_min[0] > box_max[0] or box_min[1] > box_max[1]:
+        raise Exception('Tote is too small')
+
+    method = method.lower()
+    if method == 'lattice':
+        positions = _lattice_packing(box_min, box_max, 2 * radius + gap, num)
+    elif method == 'poisson':
+        positions = _poisson_disk_packing(box_min, box_max, 2 * radius + gap, num)
+    else:
+        raise Exception('Unknown packing method: {}'.format(method))
+    if len(positions) < num:
+        raise Exception('Tote is too small')
+
+    eulers = _uniform_rotation_eulers(_low_discrepancy_sequence(3)(len(positions)))
+    return [(tuple(pos), tuple(euler)) for pos, euler in zip(positions, eulers)]
+
+
 def in_view_checker(cam_pose: List[List[float]],
                     cam_intrinsics: List[List[float]],
                     image_resolution: List[int]) -> Callable:
@@ -64,66 +209,132 @@ def in_view_checker(cam_pose: List[List[float]],
     :type cam_intrinsics: List of Lists
     :param image_resolution: [image_width, image_width]
     :type image_resolution: List
-    :return: in view checker
+    :return: in view checker, call it with points of shape (N, 3) to get a bool, or with a batch of points of shape
+        (B, N, 3) to get a (B,) bool array
     :rtype: function
     """
-    world2cam = Matrix(cam_pose).copy()
-    world2cam.invert()
-    cam_K = Matrix(cam_intrinsics)
-
-    def checker(pts: List[Vector]):
-        pts_img = [cam_K @ (world2cam @ p) for p in pts]
-        pts_img = np.array([(p[0] / p[2], p[1] / p[2]) for p in pts_img], dtype=np.float32)
-        min_x = pts_img[:, 0].min()
-        max_x = pts_img[:, 0].max()
-        min_y = pts_img[:, 1].min()
-        max_y = pts_img[:, 1].max()
-        return min_x > 0 and max_x < image_resolution[0] and min_y > 0 and max_y < image_resolution[1]
+    world2cam = np.linalg.inv(np.array(cam_pose, dtype=np.float64))
+    cam_K = np.array(cam_intrinsics, dtype=np.float64)
+    width, height = image_resolution[0], image_resolution[1]
+    fx, fy, cx, cy = cam_K[0, 0], cam_K[1, 1], cam_K[0, 2], cam_K[1, 2]
+    # inward normals of the four side planes of the view frustum in camera coordinates
+    planes = np.array([[fx, 0, cx], [-fx, 0, width - cx], [0, fy, cy], [0, -fy, height - cy]], dtype=np.float64)
+    planes /= np.linalg.norm(planes, axis=-1, keepdims=True)
+
+    def checker(pts) -> np.ndarray:
+        pts = np.asarray(pts, dtype=np.float64)
+        pts_cam = pts @ world2cam[:3, :3].T + world2cam[:3, 3]
+        z = pts_cam[..., 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pts_img = (pts_cam @ cam_K.T)[..., :2] / z[..., None]
+        inside = (z > 0) & (pts_img[..., 0] > 0) & (pts_img[..., 0] < width) & \
+                 (pts_img[..., 1] > 0) & (pts_img[..., 1] < height)
+        return inside.all(axis=-1)
 
+    def sphere_checker(centers: np.ndarray, radius: float) -> (np.ndarray, np.ndarray):
+        """Return (accepted, rejected) bool arrays for spheres of shape (B, 3). A sphere is accepted if it is entirely
+        in view, and rejected if its center, which must be inside the convex hull of the points, is out of view"""
+        centers_cam = np.asarray(centers, dtype=np.float64) @ world2cam[:3, :3].T + world2cam[:3, 3]
+        distances = centers_cam @ planes.T
+        accepted = (centers_cam[:, 2] > radius) & np.all(distances > radius, axis=-1)
+        rejected = (centers_cam[:, 2] <= 0) | np.any(distances <= 0, axis=-1)
+        return accepted, rejected
+
+    checker.sphere_checker = sphere_checker
     return checker
 
 
 def in_views_sampler(obj_name: str,
                      rand_loc: List[List[float]],
                      rand_rot: List[List[float]],
-                     checkers: List[Callable]) -> Callable:
-    """Randomly sample poses and check whether an object can be observed completely by multiple cameras
+                     checkers: List[Callable],
+                     max_trials: int = 10000,
+                     sequence: str = 'halton',
+                     batch_size: int = 64) -> Callable:
+    """Randomly sample poses and check whether an object can be observed completely by multiple cameras. Only the
+    convex hull vertices of the object are checked, and candidates are evaluated in batches
 
     :param obj_name: name of object to be sampled
     :type obj_name: str
     :param rand_loc: range of random location, [[min_x, max_x], [min_y, max_y], [min_z, max_z]]
     :type rand_loc: List of Lists
-    :param rand_rot: range of random euler angle in degree, [[min_r, max_r], [min_p, max_p], [min_y, max_y]]
+    :param rand_rot: range of random euler angle in degree, [[min_r, max_r], [min_p, max_p], [min_y, max_y]]. If all
+        ranges cover 360 degrees, rotations are uniformly distributed over SO(3)
     :type rand_rot: List of Lists
-    :param checkers: checker functions
+    :param checkers: checker functions, which take points of shape (B, N, 3) and return a (B,) bool array
     :type checkers: List of functions
+    :param max_trials: the sampler raises an exception if no pose passes the checkers in this number of trials
+    :type max_trials: int
+    :param sequence: "halton" for low-discrepancy poses which cover the space with fewer trials, or "random"
+    :type sequence: str
+    :param batch_size: number of candidate poses evaluated per batch
+    :type batch_size: int
+    :return: pose sampler returning a 4x4 matrix, the number of trials and accepted poses are in its attribute *stats*
+    :rtype: function
     """
     obj = get_object_by_name(obj_name)
-    pts = [v.co.copy() for v in obj.data.vertices]
+    pts = _get_cached_hull_vertices(obj.data)
+    if len(pts) == 0:
+        # the hull of flat or collinear meshes is degenerate, check all of their vertices instead
+        pts = _get_cached_mesh_arrays(obj.data)[0]
+    if len(pts) == 0:
+        raise Exception('Object has no vertices: {}'.format(obj_name))
+    center = pts.mean(axis=0)
+    radius = np.linalg.norm(pts - center, axis=-1).max()
+    loc_min = np.array([r[0] for r in rand_loc], dtype=np.float64)
+    loc_extent = np.array([r[1] - r[0] for r in rand_loc], dtype=np.float64)
+    rot_min = np.array([r[0] for r in rand_rot], dtype=np.float64)
+    rot_extent = np.array([r[1] - r[0] for r in rand_rot], dtype=np.float64)
+    full_rotation = np.all(rot_extent >= 360)
+    draw = _low_discrepancy_sequence(6, sequence)
+    stats = dict(trials=0, accepted=0)
 
     def sampler():
-        while True:
-            pos = _min_max_sampler(rand_loc[0], rand_loc[1], rand_loc[2])
-            angles = _min_max_sampler(rand_rot[0], rand_rot[1], rand_rot[2])
-            angles = [angle / 180 * math.pi for angle in angles]
-            euler = Euler(angles)
-            rot3x3 = euler.to_matrix()
-            matrix_world = Matrix([
-                (rot3x3[0][0], rot3x3[0][1], rot3x3[0][2], pos[0]),
-                (rot3x3[1][0], rot3x3[1][1], rot3x3[1][2], pos[1]),
-                (rot3x3[2][0], rot3x3[2][1], rot3x3[2][2], pos[2]),
-                (0, 0, 0, 1)
-            ])
-            pts_world = [matrix_world @ p for p in pts]
-            all_passed = True
+        trials = 0
+        while trials < max_trials:
+            num = min(batch_size, max_trials - trials)
+            u = draw(num)
+            positions = loc_min + u[:, :3] * loc_extent
+            if full_rotation:
+                eulers = _uniform_rotation_eulers(u[:, 3:])
+            else:
+                eulers = (rot_min + u[:, 3:] * rot_extent) / 180 * math.pi
+            rotations = _euler_to_matrix(eulers)
+            centers = rotations @ center + positions
+            passed = np.ones(num, dtype=bool)
             for checker in checkers:
-                all_passed = all_passed and checker(pts_world)
-                if not all_passed:
+                undecided = passed.copy()
+                if hasattr(checker, 'sphere_checker'):
+                    accepted, rejected = checker.sphere_checker(centers, radius)
+                    passed &= ~rejected
+                    undecided &= ~accepted & ~rejected
+                indices = np.nonzero(undecided)[0]
+                if len(indices) > 0:
+                    pts_world = pts @ rotations[indices].transpose(0, 2, 1) + positions[indices, None]
+                    passed[indices] = np.asarray(checker(pts_world), dtype=bool)
+                if not np.any(passed):
                     break
-            if all_passed:
+            accepted_indices = np.nonzero(passed)[0]
+            if len(accepted_indices) > 0:
+                index = accepted_indices[0]
+                trials += index + 1
+                stats['trials'] += index + 1
+                stats['accepted'] += 1
+                print('Sampled pose in {} trials, acceptance rate: {:.2%}'.format(
+                    trials, stats['accepted'] / stats['trials']))
+                matrix_world = Matrix.Identity(4)
+                matrix_world.translation = Vector(positions[index])
+                for i in range(3):
+                    for j in range(3):
+                        matrix_world[i][j] = rotations[index, i, j]
                 return matrix_world
+            trials += num
+            stats['trials'] += num
+        raise Exception('Failed to sample a pose in {} trials, acceptance rate: {:.2%}'.format(
+            max_trials, stats['accepted'] / max(stats['trials'], 1)))
 
+    sampler.stats = stats
     return sampler
 
 
-__all__ = ['in_tote_sampler', 'in_view_checker', 'in_views_sampler']
+__all__ = ['in_tote_sampler', 'in_tote_layout', 'in_view_checker', 'in_views_sampler']
@@ -3,8 +3,13 @@ import os
 import math
 from glob import glob
 from typing import List
+from collections import OrderedDict
 from blenderfunc.utility.utility import get_material_by_name, get_object_by_name
 
+# loaded images in least recently used order, key=abspath, value=(mtime, image name, size in bytes)
+_image_cache = OrderedDict()
+_image_cache_size = 2048 * 1024 * 1024
+
 
 def get_hdr_material_infos(hdr_root: str = 'resources/hdr') -> dict:
     """Get the information of HDR materials, we use free textures from polyhaven.com
@@ -100,17 +105,81 @@ def get_pbr_material_infos(texture_root: str = 'resources/cctextures') -> dict:
     return texture_info
 
 
+def set_image_cache_size(max_megabytes: float):
+    """Set the memory budget of the image cache, least recently used images are removed when it is exceeded
+
+    :param max_megabytes: memory budget in megabytes, default: 2048
+    :type max_megabytes: float
+    """
+    global _image_cache_size
+    _image_cache_size = int(max_megabytes * 1024 * 1024)
+    _evict_images()
+
+
+def clear_image_cache():
+    """Remove all cached images that are not used by any data block"""
+    global _image_cache_size
+    size = _image_cache_size
+    _image_cache_size = 0
+    _evict_images()
+    _image_cache_size = size
+
+
+def _get_cached_image(abspath: str):
+    """return the cached image of a file if it is still loaded and up to date, stale entries are removed"""
+    entry = _image_cache.get(abspath, None)
+    if entry is None:
+        return None
+    mtime, name, _ = entry
+    image = bpy.data.images.get(name, None)
+    if image is not None and image.filepath == abspath and mtime == os.path.getmtime(abspath):
+        _image_cache.move_to_end(abspath)
+        return image
+    del _image_cache[abspath]
+    if image is not None and image.filepath == abspath:
+        bpy.data.images.remove(image)
+    return None
+
+
+def _evict_images(keep: str = None):
+    """remove least recently used images until the cache fits in its memory budget, images still used by other
+    data blocks are kept"""
+    total = sum(entry[2] for entry in _image_cache.values())
+    for abspath in list(_image_cache.keys()):
+        if total <= _image_cache_size:
+            break
+        if abspath == keep:
+            continue
+        _, name, size = _image_cache[abspath]
+        image = bpy.data.images.get(name, None)
+        if image is not None and image.filepath == abspath:
+            if image.users > 1:
+                continue
+            bpy.data.images.remove(image)
+        del _image_cache[abspath]
+        total -= size
+
+
 def load_image(path) -> bpy.types.Image:
-    """Load an image to Blender environment, the name of loaded image will be set to its basename
+    """Load an image to Blender environment. Loaded images are cached by absolute path and modification time,
+    protected with fake users so they survive initialize() and remove_all_data(), and removed in least recently
+    used order when the cache exceeds its memory budget, see set_image_cache_size()
 
     :param path: path to the image to be loaded
     :return: blender image object
     :rtype: bpy.types.Image
     """
-    loaded_img = bpy.data.images.get(os.path.basename(path), None)
-    if loaded_img:
-        return loaded_img
-    return bpy.data.images.load(os.path.abspath(path))
+    abspath = os.path.abspath(path)
+    image = _get_cached_image(abspath)
+    if image is not None:
+        return image
+    image = bpy.data.images.load(abspath)
+    image.use_fake_user = True
+    width, height = image.size
+    size = width * height * max(image.channels, 1) * (4 if image.is_float else 1)
+    _image_cache[abspath] = (os.path.getmtime(abspath), image.name, size)
+    _evict_images(keep=abspath)
+    return image
 
 
 def set_material(obj_name: str, mat_name: str):
@@ -331,4 +400,5 @@ def add_transparent_material(name: str = "Material", emission_strength: float =
 
 
 __all__ = ['get_pbr_material_infos', 'add_pbr_material', 'add_simple_material', 'load_image', 'set_material',
-           'get_hdr_material_infos', 'set_hdr_background', 'add_transparent_material']
+           'get_hdr_material_infos', 'set_hdr_background', 'add_transparent_material', 'set_image_cache_size',
+           'clear_image_cache']
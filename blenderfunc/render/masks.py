@@ -0,0 +1,110 @@
+import numpy as np
+from typing import List
+
+
+class _MaskEncoder:
+    """Encode binary masks one by one into bit-packed crops of their bounding boxes, so only one dense mask is in
+    memory at a time"""
+
+    def __init__(self, shape: tuple):
+        self.shape = tuple(shape)
+        self.bboxes = []
+        self.areas = []
+        self.bits = []
+
+    def add(self, mask: np.ndarray):
+        """encode a binary mask (H, W)"""
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != self.shape:
+            raise Exception('Mask shape {} does not match {}'.format(mask.shape, self.shape))
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if len(rows) == 0:
+            bbox = [0, 0, 0, 0]
+        else:
+            bbox = [rows[0], cols[0], rows[-1] + 1, cols[-1] + 1]
+        crop = mask[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+        self.bboxes.append(bbox)
+        self.areas.append(np.count_nonzero(crop))
+        self.bits.append(np.packbits(crop, axis=None))
+
+    def to_dict(self) -> dict:
+        lengths = [len(bits) for bits in self.bits]
+        return dict(shape=np.array(self.shape, dtype=np.int64),
+                    bboxes=np.array(self.bboxes, dtype=np.int32).reshape(-1, 4),
+                    areas=np.array(self.areas, dtype=np.int64),
+                    offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                    bits=np.concatenate(self.bits) if self.bits else np.zeros(0, dtype=np.uint8))
+
+
+def encode_masks(masks: np.ndarray) -> dict:
+    """Encode binary masks into bit-packed crops of their bounding boxes
+
+    :param masks: binary masks (N, H, W)
+    :type masks: np.ndarray
+    :return: encoded masks with keys: shape (2,), bboxes (N, 4) as [y_min, x_min, y_max, x_max), areas (N,),
+        offsets (N + 1,) and bits, the packed bits of mask i are bits[offsets[i]:offsets[i + 1]]
+    :rtype: dict
+    """
+    masks = np.asarray(masks)
+    encoder = _MaskEncoder(masks.shape[1:])
+    for mask in masks:
+        encoder.add(mask)
+    return encoder.to_dict()
+
+
+def load_masks(filepath: str) -> dict:
+    """Load encoded masks from a ".npz" file saved by render_object_masks()
+
+    :param filepath: ".npz" filepath
+    :type filepath: str
+    :return: encoded masks, see encode_masks()
+    :rtype: dict
+    """
+    with np.load(filepath) as data:
+        return {key: data[key] for key in data.files}
+
+
+def decode_mask(masks: dict, index: int, crop: bool = False) -> np.ndarray:
+    """Decode one mask from encoded masks
+
+    :param masks: encoded masks, see encode_masks()
+    :type masks: dict
+    :param index: index of the mask
+    :type index: int
+    :param crop: return only the bounding box crop of the mask if true
+    :type crop: bool
+    :return: binary mask (H, W), or the crop (y_max - y_min, x_max - x_min)
+    :rtype: np.ndarray
+    """
+    y0, x0, y1, x1 = [int(v) for v in masks['bboxes'][index]]
+    bits = masks['bits'][masks['offsets'][index]:masks['offsets'][index + 1]]
+    count = (y1 - y0) * (x1 - x0)
+    patch = np.unpackbits(bits, count=count).reshape(y1 - y0, x1 - x0).astype(bool)
+    if crop:
+        return patch
+    mask = np.zeros(tuple(masks['shape']), dtype=bool)
+    mask[y0:y1, x0:x1] = patch
+    return mask
+
+
+def decode_masks(masks: dict, indices: List[int] = None) -> np.ndarray:
+    """Decode encoded masks to dense binary masks
+
+    :param masks: encoded masks, see encode_masks()
+    :type masks: dict
+    :param indices: indices of masks to decode, all masks if None
+    :type indices: List[int]
+    :return: binary masks (N, H, W)
+    :rtype: np.ndarray
+    """
+    if indices is None:
+        indices = range(len(masks['bboxes']))
+    ret = np.zeros((len(indices),) + tuple(masks['shape']), dtype=bool)
+    for i, index in enumerate(indices):
+        y0, x0, y1, x1 = [int(v) for v in masks['bboxes'][index]]
+        ret[i, y0:y1, x0:x1] = decode_mask(masks, index, crop=True)
+    return ret
+
+
+__all__ = ['encode_masks', 'load_masks', 'decode_mask', 'decode_masks']
@@ -10,6 +10,7 @@ from typing import List
 from blenderfunc.object.texture import load_image
 from blenderfunc.object.light import set_background_light
 from blenderfunc.object.meshes import get_all_mesh_objects
+from blenderfunc.render.masks import _MaskEncoder
 from blenderfunc.utility.utility import save_blend, get_object_by_name, remove_all_materials
 
 
@@ -384,6 +385,8 @@ def render_instance_segmap(filepath: str = '/tmp/temp.png', save_blend_file=Fals
     :param filepath: the output image path, only for visualization
     :param save_blend_file: save the “.blend” file if true
     :param save_npz: save the instance segmentation map array to a ".npz" (compressed numpy) file if true
+    :return: instance segmentation map (H, W)
+    :rtype: np.ndarray
     """
     if os.path.splitext(filepath)[-1] not in ['.png']:
         raise Exception('Unsupported image format: {}'.format(os.path.splitext(filepath)))
@@ -465,6 +468,7 @@ def render_instance_segmap(filepath: str = '/tmp/temp.png', save_blend_file=Fals
 
     bpy.ops.ed.undo_push(message='after render_instance_segmap()')
     bpy.ops.ed.undo()
+    return segmap
 
 
 def render_class_segmap(filepath: str = '/tmp/temp.png', save_blend_file=False, save_npz=True):
@@ -568,8 +572,11 @@ def render_object_masks(filepath: str = '/tmp/temp.png', save_blend_file=False,
 
     :param filepath: the output image path, only for visualization
     :param save_blend_file: save the “.blend” file if true
-    :param save_npz: save the instance segmentation map array to a ".npz" (compressed numpy) file if true
+    :param save_npz: save the encoded masks to a ".npz" (numpy) file if true, load it with load_masks()
     :param downsample: to speed up rendering, reduce the image resolution
+    :return: masks of objects in the order of get_all_mesh_objects(), encoded as bit-packed bounding box crops,
+        see encode_masks() and decode_masks()
+    :rtype: dict
     """
     if os.path.splitext(filepath)[-1] not in ['.png']:
         raise Exception('Unsupported image format: {}'.format(os.path.splitext(filepath)))
@@ -627,34 +634,61 @@ def render_object_masks(filepath: str = '/tmp/temp.png', save_blend_file=False,
     if save_blend_file:
         save_blend(os.path.splitext(filepath)[0] + '.blend')
 
-    # render
+    # render and encode masks one by one
     bpy.context.scene.frame_current = 1
-    output_files = []
+    temp_output = os.path.join(output_dir, 'image0001.jpg')
+    shape = (scene.render.resolution_y * scene.render.resolution_percentage // 100,
+             scene.render.resolution_x * scene.render.resolution_percentage // 100)
+    encoder = _MaskEncoder(shape)
+    viz_img = np.zeros(shape, dtype=np.float32)
+    for obj in mesh_objects:
+        obj.hide_render = True
     for i, obj in enumerate(mesh_objects):
-        for other_obj in mesh_objects:
-            other_obj.hide_render = True
+        if i > 0:
+            mesh_objects[i - 1].hide_render = True
         obj.hide_render = False
         bpy.ops.render.render(use_viewport=True)
-        temp_output = os.path.join(output_dir, 'image0001.jpg')
-        indexed_filepath = os.path.splitext(filepath)[0] + '_{:04}.jpg'.format(i)
-        os.rename(temp_output, indexed_filepath)
-        output_files.append(indexed_filepath)
-
-    imgs = np.array([cv2.imread(f)[:, :, 0] for f in output_files])
-    imgs = imgs > 127
-    viz_img = np.sum(imgs.astype(np.float32), axis=0)
-    viz_img = (viz_img - viz_img.min()) / (viz_img.max() - viz_img.min())
+        mask = cv2.imread(temp_output)[:, :, 0] > 127
+        os.remove(temp_output)
+        encoder.add(mask)
+        viz_img += mask
+    masks = encoder.to_dict()
+
+    if viz_img.max() > viz_img.min():
+        viz_img = (viz_img - viz_img.min()) / (viz_img.max() - viz_img.min())
     viz_img = (viz_img * 255).astype(np.uint8)
     imageio.imwrite(filepath, viz_img)
 
     if save_npz:
-        np.savez_compressed(os.path.splitext(filepath)[0] + '.npz', data=imgs)
-
-    for f in output_files:
-        os.remove(f)
+        np.savez(os.path.splitext(filepath)[0] + '.npz', **masks)
 
     bpy.ops.ed.undo_push(message='after render_object_masks()')
     bpy.ops.ed.undo()
+    return masks
+
+
+def compute_visibility(inst_segmap: np.ndarray, amodal_masks, downsample: int = 1) -> np.ndarray:
+    """Compute the visible ratio of all objects, visible area in instance segmentation map / area of object mask
+
+    :param inst_segmap: instance segmentation map (H, W), returned by render_instance_segmap()
+    :type inst_segmap: np.ndarray
+    :param amodal_masks: object masks (N, H / downsample, W / downsample), or encoded masks returned by
+        render_object_masks()
+    :type amodal_masks: np.ndarray or dict
+    :param downsample: downsample factor of the object masks
+    :type downsample: int
+    :return: visible ratios (N,) in range [0, 1], objects without mask area have zero visible ratio
+    :rtype: np.ndarray
+    """
+    if isinstance(amodal_masks, dict):
+        total_area = np.asarray(amodal_masks['areas'])
+    else:
+        total_area = np.count_nonzero(np.asarray(amodal_masks).reshape(len(amodal_masks), -1), axis=1)
+    num = len(total_area)
+    visible_area = np.bincount(np.asarray(inst_segmap).ravel(), minlength=num + 1)[1:num + 1]
+    total_area = total_area * downsample ** 2
+    visible_ratio = np.divide(visible_area, total_area, out=np.zeros(num), where=total_area > 0)
+    return np.clip(visible_ratio, 0, 1)
 
 
 def render_normal(filepath: str = '/tmp/temp.png', save_blend_file=False, save_npz=True):
@@ -734,4 +768,4 @@ def render_normal(filepath: str = '/tmp/temp.png', save_blend_file=False, save_n
 
 
 __all__ = ['render_color', 'render_depth', 'render_light_mask', 'render_instance_segmap', 'render_class_segmap',
-           'render_normal', 'apply_binary_mask', 'render_object_masks']
+           'render_normal', 'apply_binary_mask', 'render_object_masks', 'compute_visibility']
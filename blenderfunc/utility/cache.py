@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'blenderfunc')
+
+# memorized file hashes, key=(abspath, size, mtime), value=sha1
+_file_hashes = {}
+
+
+def set_cache_dir(directory: str):
+    """Set the root directory of the disk caches shared by all generation jobs,
+    default: ~/.cache/blenderfunc
+
+    :param directory: cache directory, the folder will be created if not exist
+    :type directory: str
+    """
+    global _cache_dir
+    _cache_dir = os.path.abspath(directory)
+
+
+def get_cache_dir() -> str:
+    """Get the root directory of the disk caches"""
+    return _cache_dir
+
+
+def compute_file_hash(filepath: str) -> str:
+    """Compute the sha1 hash of a file, the result is memorized until the file is modified
+
+    :param filepath: path to the file
+    :type filepath: str
+    :return: hex digest
+    :rtype: str
+    """
+    filepath = os.path.abspath(filepath)
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime)
+    if key not in _file_hashes:
+        file_hash = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+        _file_hashes[key] = file_hash.hexdigest()
+    return _file_hashes[key]
+
+
+def _get_cache_filepath(namespace: str, filepath: str, ext: str, **params) -> str:
+    """Return the cache filepath of a file processed with some parameters, the cache folder will be created"""
+    key = compute_file_hash(filepath) + json.dumps(params, sort_keys=True)
+    cache_folder = os.path.join(_cache_dir, namespace)
+    os.makedirs(cache_folder, exist_ok=True)
+    return os.path.join(cache_folder, hashlib.sha1(key.encode()).hexdigest() + ext)
+
+
+def _save_cache_npz(filepath: str, **arrays):
+    """save arrays to a ".npz" cache file atomically, so concurrent jobs never read a partially written file"""
+    temp_filepath = filepath + '.{}.tmp'.format(os.getpid())
+    with open(temp_filepath, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp_filepath, filepath)
+
+
+__all__ = ['set_cache_dir', 'get_cache_dir', 'compute_file_hash']
@@ -3,6 +3,9 @@ import bpy
 import shutil
 from glob import glob
 
+# functions resetting the module states bound to the scene, e.g. the object registry, called by remove_all_data()
+_scene_reset_callbacks = []
+
 
 def initialize():
     """Initialize Blender environments:
@@ -16,13 +19,18 @@ def initialize():
 
 
 def remove_all_data():
-    """Remove all data except the default scene"""
+    """Remove all data except the default scene and the images cached by load_image()"""
     for collection in dir(bpy.data):
         data_structure = getattr(bpy.data, collection)
         if isinstance(data_structure, bpy.types.bpy_prop_collection) and hasattr(data_structure, "remove"):
             for block in data_structure:
-                if not isinstance(block, bpy.types.Scene) or block.name != "Scene":
-                    data_structure.remove(block)
+                if isinstance(block, bpy.types.Scene) and block.name == "Scene":
+                    continue
+                if isinstance(block, bpy.types.Image) and block.use_fake_user:
+                    continue
+                data_structure.remove(block)
+    for callback in _scene_reset_callbacks:
+        callback()
 
 
 def remove_all_images():
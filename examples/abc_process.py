@@ -2,6 +2,8 @@ import sys
 sys.path.append('.')
 import os
 import sys
+import time
+import sqlite3
 import argparse
 import blenderfunc as bf
 from tqdm import tqdm
@@ -18,46 +20,89 @@ def parse_arguments():
                         help='abc dataset folder, example: abc_xxxx_stl2_v00')
     parser.add_argument('--output_dir', type=str, default='output',
                         help='output_dir')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='process the files in this manifest instead of input_dir, see scripts/ingest_abc.py')
+    parser.add_argument('--worker_id', type=int, default=0)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--max_faces', type=int, default=10000)
     args = parser.parse_args(args=argv)
     return args
 
 
+def process_file(input_file, output_dir, max_faces):
+    """return the status of input file: done | too_big | multiple_parts"""
+    bf.remove_all_meshes()
+    index = os.path.basename(os.path.dirname(input_file))
+    output_file = os.path.join(output_dir, '{}.stl'.format(index))
+
+    if os.path.getsize(input_file) > 20000000:
+        return 'too_big'
+
+    obj_name = bf.add_object_from_file(input_file, use_cache=False)
+    if bf.count_loose_parts(obj_name) != 1:
+        return 'multiple_parts'
+
+    bf.decimate_mesh_object(obj_name, max_faces=max_faces)
+    bf.export_mesh_object(output_file, obj_name, center_of_mass=True)
+    return 'done'
+
+
+def claim_files(conn, worker_id, batch_size):
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute("SELECT path FROM files WHERE status = 'pending' ORDER BY path LIMIT ?",
+                            (batch_size,)).fetchall()
+        paths = [row[0] for row in rows]
+        conn.executemany("UPDATE files SET status = 'running', worker = ?, message = NULL, updated = ? WHERE path = ?",
+                         [(worker_id, time.time(), path) for path in paths])
+    return paths
+
+
+def set_file_status(conn, path, status, message=None):
+    with conn:
+        conn.execute('UPDATE files SET status = ?, message = ?, updated = ? WHERE path = ?',
+                     (status, message, time.time(), path))
+
+
 args = parse_arguments()
 bf.initialize()
 bf.initialize_folder(args.output_dir, clear_files=False)
-input_files = sorted(list(glob(os.path.join(args.input_dir, '*', '*.stl'))))
-input_file = None
-for input_file in tqdm(input_files, position=0, leave=True):
-    try:
-        bf.initialize()
+
+if args.manifest is not None:
+    # persistent worker of scripts/ingest_abc.py, claim files from the shared manifest until none is left
+    conn = sqlite3.connect(args.manifest, timeout=60, isolation_level=None)
+    while True:
+        paths = claim_files(conn, args.worker_id, args.batch_size)
+        if not paths:
+            break
+        for path in paths:
+            print('Worker {} process file: {}'.format(args.worker_id, path))
+            # a file still marked as processing after the worker died is not retried
+            set_file_status(conn, path, 'running', 'processing')
+            try:
+                status = process_file(path, args.output_dir, args.max_faces)
+                set_file_status(conn, path, status)
+            except Exception as e:
+                print('Failed to process file: {}, {}'.format(path, e))
+                set_file_status(conn, path, 'error', str(e))
+    conn.close()
+else:
+    input_files = sorted(list(glob(os.path.join(args.input_dir, '*', '*.stl'))))
+    input_file = None
+    for input_file in tqdm(input_files, position=0, leave=True):
         print('-' * 80)
         print('Process file: {}'.format(input_file))
-        index = os.path.basename(os.path.dirname(input_file))
-        output_file = os.path.join(args.output_dir, '{}.stl'.format(index))
-
-        if os.path.getsize(input_file) > 20000000:
-            print('File too big, ignored')
+        try:
+            status = process_file(input_file, args.output_dir, args.max_faces)
+            print('Status: {}'.format(status))
             os.remove(input_file)
-            continue
-
-        obj_name = bf.add_object_from_file(input_file)
-        objs = bf.separate_isolated_meshes(obj_name)
+        except Exception as e:
+            print('Failed to process file: {}, {}'.format(input_file, e))
 
-        if len(objs) != 1:
-            print('More than one part, ignored')
-            os.remove(input_file)
-            continue
-
-        bf.decimate_mesh_object(obj_name, max_faces=10000)
-        bf.export_mesh_object(output_file, obj_name, center_of_mass=True)
-        os.remove(input_file)
-    except:
-        pass
-
-# check if all files are processed
-f = open(os.path.join(args.output_dir, 'exit_status'), 'w')
-if input_file == input_files[-1]:
-    f.write('Done\n')
-else:
-    f.write('{}\n'.format(input_file))
-f.close()
+    # check if all files are processed
+    f = open(os.path.join(args.output_dir, 'exit_status'), 'w')
+    if input_file == input_files[-1]:
+        f.write('Done\n')
+    else:
+        f.write('{}\n'.format(input_file))
+    f.close()
@@ -2,7 +2,6 @@ import sys
 
 sys.path.append('.')
 import blenderfunc as bf
-import bpy
 import argparse
 import os
 import sys
@@ -103,18 +102,22 @@ def parse_arguments():
     parser.add_argument('--num_pick', type=int, default=5, help='number of objects picked each time, default: 5')
     parser.add_argument('--max_bounces', type=int, default=3, help='render option: max bounces of light, default: 3')
     parser.add_argument('--samples', type=int, default=10, help='render option: samples for each pixel, default: 10')
-    parser.add_argument('--substeps_per_frame', type=int, default=20,
-                        help='physics option: higher value for higher simulation stability, default: 10')
+    parser.add_argument('--substeps_per_frame', type=str, default='AUTO',
+                        help='physics option: higher value for higher simulation stability, default: AUTO')
     parser.add_argument('--enable_perfect_depth', action="store_true", help='flag: render depth without obstruction')
     parser.add_argument('--enable_instance_segmap', action="store_true", help='flag: render instance segmentation map')
     parser.add_argument('--enable_object_masks', action="store_true", help='flag: render object masks')
     parser.add_argument('--enable_class_segmap', action="store_true", help='flag: render class segmentation map')
     parser.add_argument('--enable_mesh_info', action="store_true", help='flag: write mesh information including poses')
+    parser.add_argument('--mesh_info_format', type=str, default='csv',
+                        help='file format of mesh information: csv | npz')
     args = parser.parse_args(args=argv)
     return args
 
 
 args = parse_arguments()
+if args.substeps_per_frame.upper() != 'AUTO':
+    args.substeps_per_frame = int(args.substeps_per_frame)
 camera = camera_infos[args.camera_type]
 cam_pose = [[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, -1, args.camera_height], [0, 0, 0, 1]]
 output_dir = args.output_dir
@@ -134,48 +137,29 @@ for _ in range(args.num_regen):
     bf.add_plane(size=100, properties=dict(physics=False, collision_shape='CONVEX_HULL', class_id=0))
 
     # add tote
+    # box colliders with a tall invisible fence prevent objects from falling outside the tote
     tote = bf.add_tote(length=args.tote_length, width=args.tote_width, height=args.tote_height,
-                       thickness=args.tote_thickness, name='Tote',
-                       properties=dict(physics=False, collision_shape='MESH', collision_margin=0.002, class_id=1))
-
-    # HACK: add a virtual tote to prevent objects from falling outside the real tote
-    virtual_tote = bf.add_tote(length=args.tote_length, width=args.tote_width, height=100,
-                               thickness=args.tote_thickness, name='VirtualTote',
-                               properties=dict(physics=False, collision_shape='MESH', class_id=1))
-    bf.get_object_by_name(virtual_tote).hide_render = True
-
-    # rescale object & export
-    obj = bf.add_object_from_file(filepath=args.model_path, max_faces=args.max_faces)
-    if args.model_max_dimension > 0:
-        origin_dimensions = bf.get_object_by_name(obj).dimensions
-        scale = args.model_max_dimension / max(origin_dimensions)
-        bf.get_object_by_name(obj).dimensions = (origin_dimensions[0] * scale,
-                                                 origin_dimensions[1] * scale,
-                                                 origin_dimensions[2] * scale)
-        bpy.context.view_layer.update()
-    bf.export_mesh_object(filepath=os.path.join(output_dir, 'model.stl'), obj_name=obj, center_of_mass=True)
-
-    # reload object
-    bf.remove_mesh_object(obj)
-    obj = bf.add_object_from_file(filepath=os.path.join(output_dir, 'model.stl'), name="Model",
+                       thickness=args.tote_thickness, name='Tote', physics_proxy=True, fence_height=100,
+                       properties=dict(physics=False, collision_margin=0.002, class_id=1))
+
+    # decimate, rescale and center the object, the processed geometry is cached on disk after the first load
+    max_dimension = args.model_max_dimension if args.model_max_dimension > 0 else None
+    obj = bf.add_object_from_file(filepath=args.model_path, name="Model", max_faces=args.max_faces,
+                                  max_dimension=max_dimension, center_of_mass=True,
                                   properties=dict(physics=True, collision_shape='CONVEX_HULL', class_id=2))
+    bf.export_mesh_object(filepath=os.path.join(output_dir, 'model.stl'), obj_name=obj)
 
-    # compute fill up number
-    obj_dimensions = bf.get_object_by_name(obj).dimensions
-    obj_volume = obj_dimensions[0] * obj_dimensions[1] * obj_dimensions[2]
+    # compute fill up number, convex objects fill at most about 64% of a container when randomly packed
+    obj_volume = bf.mesh_stats(obj)['hull_volume']
     tote_volume = args.tote_length * args.tote_width * args.tote_height
-    args.num_begin = min(args.num_begin, int(tote_volume / obj_volume))
-
-    # collision free positioning
-    space_factor = 1.0
-    pose_sampler = bf.in_tote_sampler(tote, obj, args.num_begin * space_factor)
-    bf.collision_free_positioning(obj, pose_sampler)
-    for i in range(args.num_begin - 1):
-        print('{}/{}'.format(i, args.num_begin))
-        obj = bf.duplicate_mesh_object(obj)
-        while not bf.collision_free_positioning(obj, pose_sampler):
-            space_factor *= 2
-            pose_sampler = bf.in_tote_sampler(tote, obj, args.num_begin * space_factor)
+    args.num_begin = min(args.num_begin, int(0.64 * tote_volume / obj_volume))
+
+    # dense non-overlapping initial layout, objects are spawned as low as possible
+    poses = bf.in_tote_layout(tote, obj, args.num_begin)
+    obj_names = [obj] + bf.instantiate_mesh_object(obj, len(poses) - 1)
+    for obj_name, (location, euler) in zip(obj_names, poses):
+        bf.get_object_by_name(obj_name).location = location
+        bf.get_object_by_name(obj_name).rotation_euler = euler
 
     bf.physics_simulation(substeps_per_frame=args.substeps_per_frame, max_simulation_time=3)
     n_removed = bf.remove_mesh_objects_out_box([-args.tote_length / 2, args.tote_length / 2,
@@ -183,16 +167,15 @@ for _ in range(args.num_regen):
                                                 args.tote_thickness, args.tote_thickness + args.tote_height],
                                                bf.get_mesh_objects_by_custom_properties(dict(class_id=2)))
     print('{} objects out of tote are removed'.format(n_removed))
-    bf.remove_mesh_object(virtual_tote)
 
     args.num_begin = len(bf.get_mesh_objects_by_custom_properties(dict(class_id=2)))
     num_pick_seq = compute_num_pick_sequence(args.num_begin, args.num_end, args.num_pick)
     for num_pick in num_pick_seq:
         image_index += 1
-        for _ in range(num_pick):
-            bf.remove_highest_mesh_object()
+        bf.remove_highest_mesh_objects(num_pick)
         if num_pick > 0:
-            bf.physics_simulation(substeps_per_frame=args.substeps_per_frame, max_simulation_time=3)
+            bf.physics_simulation(substeps_per_frame=args.substeps_per_frame, max_simulation_time=3,
+                                  local_wake_up=True)
         timestamp = int(time.time())
         prefix = '{}/data/{:04}_'.format(output_dir, image_index)
         bf.render_color(prefix + 'color.png', denoiser='OPTIX', samples=args.samples, max_bounces=args.max_bounces,
@@ -203,18 +186,13 @@ for _ in range(args.num_regen):
             bf.apply_binary_mask(prefix + 'depth.png', prefix + 'lightmask.png', prefix + 'depth.png')
             os.remove(prefix + 'lightmask.png')
         if args.enable_instance_segmap:
-            bf.render_instance_segmap(prefix + 'instmap.png')
+            inst_segmap = bf.render_instance_segmap(prefix + 'instmap.png')
         if args.enable_object_masks:
-            bf.render_object_masks(prefix + 'objmasks.png', downsample=4)
+            obj_masks = bf.render_object_masks(prefix + 'objmasks.png', downsample=4)
         if args.enable_class_segmap:
             bf.render_class_segmap(prefix + 'clsmap.png')
         if args.enable_mesh_info:
             visible_ratio = None
             if args.enable_instance_segmap and args.enable_object_masks:
-                inst_segmap = np.load(prefix + 'instmap.npz')['data']
-                obj_masks = np.load(prefix + 'objmasks.npz')['data']
-                visible_area = np.array([np.sum(inst_segmap == (i + 1)) for i in range(len(obj_masks))])
-                total_area = np.sum(np.sum(obj_masks, axis=-1), axis=-1)
-                total_area *= 16  # masks are downsampled by 4
-                visible_ratio = np.clip(visible_area / total_area, 0, 1)
-            bf.export_meshes_info(prefix + 'pose.csv', visible_ratio=visible_ratio)
+                visible_ratio = bf.compute_visibility(inst_segmap, obj_masks, downsample=4)
+            bf.export_meshes_info(prefix + 'pose.' + args.mesh_info_format, visible_ratio=visible_ratio)
@@ -12,8 +12,8 @@ bf.initialize_folder(output_dir, clear_files=True)
 bf.set_background_light(strength=1)
 bf.set_camera(pose=[[1,0,0,0], [0,-1,0,0], [0,0,-1,camera_height], [0,0,0,1]])
 bf.add_plane(size=100, properties=dict(physics=False, collision_shape='CONVEX_HULL'))
-tote = bf.add_tote(length=0.7, width=0.9, height=0.7, properties=dict(physics=False, collision_shape='MESH'))
-obj = bf.add_object_from_file(filepath=model_filepath,
+tote = bf.add_tote(length=0.7, width=0.9, height=0.7, physics_proxy=True, properties=dict(physics=False))
+obj = bf.add_object_from_file(filepath=model_filepath, center_of_mass=True,
                               properties=dict(physics=True, collision_shape='CONVEX_HULL'))
 
 pose_sampler = bf.in_tote_sampler(tote, obj, num)
@@ -25,6 +25,6 @@ bf.save_blend('{}/before_simulation.blend'.format(output_dir))
 
 for i in range(num):
     bf.remove_highest_mesh_object()
-    bf.physics_simulation()
+    bf.physics_simulation(local_wake_up=True)
     bf.render_color('{}/{:04}.png'.format(output_dir, i), samples=50, denoiser='NLM',
                     save_blend_file=True if i ==0 else False)
@@ -133,9 +133,7 @@ for model_file in tqdm(args.model_files):
     obj.rotation_euler = (0, 0, 0)
 
     # determine ortho-camera zoom
-    vertices = np.array([v.co for v in obj.data.vertices])
-    min_bound = np.min(vertices, axis=0)
-    max_bound = np.max(vertices, axis=0)
+    min_bound, max_bound = bf.mesh_stats(obj_name)['aabb']
     ortho_scales = 2 * np.maximum(np.abs(min_bound), np.abs(max_bound))
 
     img_grid = [None] * 4
@@ -100,6 +100,8 @@ def parse_arguments():
     parser.add_argument('--enable_object_masks', action="store_true", help='flag: render object masks')
     parser.add_argument('--enable_class_segmap', action="store_true", help='flag: render class segmentation map')
     parser.add_argument('--enable_mesh_info', action="store_true", help='flag: write mesh information including poses')
+    parser.add_argument('--mesh_info_format', type=str, default='csv',
+                        help='file format of mesh information: csv | npz')
     args = parser.parse_args(args=argv)
     return args
 
@@ -143,7 +145,7 @@ dimensions = bf.get_object_by_name(obj).dimensions
 bf.get_object_by_name(obj).location = [-args.tote_width / 2 + dimensions[0] / 2,
                                        -args.tote_length / 2 + dimensions[1] / 2,
                                        dimensions[2] / 2]
-layer_head_obj = row_head_obj = last_obj = obj
+layer_head_location = row_head_location = last_location = np.array(bf.get_object_by_name(obj).location)
 num_cur = 1
 
 image_index = 0
@@ -152,23 +154,22 @@ for num_obj in range(args.num_begin, args.num_end + 1, args.num_put):
         continue
     num_put = num_obj - num_cur
     num_cur = num_obj
+    # compute the locations of new objects first, then create all of them at once
+    matrices = []
     for _ in range(num_put):
-        cur_obj = bf.duplicate_mesh_object(last_obj)
-        cur_location = bf.get_object_by_name(cur_obj).location
-        if cur_location[0] + dimensions[0]/2 + dimensions[0] + args.x_gap < args.tote_width/2:
-            bf.get_object_by_name(cur_obj).location[0] += dimensions[0] + args.x_gap
-            last_obj = cur_obj
-        elif bf.get_object_by_name(row_head_obj).location[1] + dimensions[1]/2 + dimensions[1] + args.y_gap < args.tote_length/2:
-            bf.get_object_by_name(cur_obj).location = bf.get_object_by_name(row_head_obj).location
-            bf.get_object_by_name(cur_obj).location[1] += dimensions[1] + args.y_gap
-            last_obj = cur_obj
-            row_head_obj = cur_obj
+        if last_location[0] + dimensions[0]/2 + dimensions[0] + args.x_gap < args.tote_width/2:
+            last_location = last_location + np.array([dimensions[0] + args.x_gap, 0, 0])
+        elif row_head_location[1] + dimensions[1]/2 + dimensions[1] + args.y_gap < args.tote_length/2:
+            last_location = row_head_location + np.array([0, dimensions[1] + args.y_gap, 0])
+            row_head_location = last_location
         else:
-            bf.get_object_by_name(cur_obj).location = bf.get_object_by_name(layer_head_obj).location
-            bf.get_object_by_name(cur_obj).location[2] += dimensions[2]
-            last_obj = cur_obj
-            row_head_obj = cur_obj
-            layer_head_obj = cur_obj
+            last_location = layer_head_location + np.array([0, 0, dimensions[2]])
+            row_head_location = layer_head_location = last_location
+        matrix = np.array(bf.get_object_by_name(obj).matrix_world)
+        matrix[:3, 3] = last_location
+        matrices.append(matrix)
+    if num_put > 0:
+        bf.instantiate_mesh_object(obj, num_put, matrices=np.array(matrices))
 
     # bf.save_blend(os.path.join(output_dir, 'scene_{:04}.blend'.format(image_index)))
 
@@ -181,19 +182,14 @@ for num_obj in range(args.num_begin, args.num_end + 1, args.num_put):
         bf.apply_binary_mask(prefix + 'depth.png', prefix + 'lightmask.png', prefix + 'depth.png')
         os.remove(prefix + 'lightmask.png')
     if args.enable_instance_segmap:
-        bf.render_instance_segmap(prefix + 'instmap.png')
+        inst_segmap = bf.render_instance_segmap(prefix + 'instmap.png')
     if args.enable_object_masks:
-        bf.render_object_masks(prefix + 'objmasks.png', downsample=4)
+        obj_masks = bf.render_object_masks(prefix + 'objmasks.png', downsample=4)
     if args.enable_class_segmap:
         bf.render_class_segmap(prefix + 'clsmap.png')
     if args.enable_mesh_info:
         visible_ratio = None
         if args.enable_instance_segmap and args.enable_object_masks:
-            inst_segmap = np.load(prefix + 'instmap.npz')['data']
-            obj_masks = np.load(prefix + 'objmasks.npz')['data']
-            visible_area = np.array([np.sum(inst_segmap == (i + 1)) for i in range(len(obj_masks))])
-            total_area = np.sum(np.sum(obj_masks, axis=-1), axis=-1)
-            total_area *= 16  # masks are downsampled by 4
-            visible_ratio = np.clip(visible_area / total_area, 0, 1)
-        bf.export_meshes_info(prefix + 'pose.csv', visible_ratio=visible_ratio)
+            visible_ratio = bf.compute_visibility(inst_segmap, obj_masks, downsample=4)
+        bf.export_meshes_info(prefix + 'pose.' + args.mesh_info_format, visible_ratio=visible_ratio)
     image_index += 1
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import struct
+import sqlite3
+import argparse
+import subprocess
+from glob import glob
+
+# status of files in manifest:
+#   pending -> running -> done | multiple_parts | error
+#   pending -> too_big | too_many_triangles (prefiltered without importing)
+#   running -> crashed (the blender worker died while processing it)
+_CREATE_TABLE = '''CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    message TEXT,
+    worker INTEGER,
+    size INTEGER,
+    num_triangles INTEGER,
+    updated REAL)'''
+
+
+def connect_manifest(filepath):
+    conn = sqlite3.connect(filepath, timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(_CREATE_TABLE)
+    return conn
+
+
+def read_stl_num_triangles(filepath):
+    """number of triangles in the header of binary STL, None for ASCII STL"""
+    size = os.path.getsize(filepath)
+    if size < 84:
+        return None
+    with open(filepath, 'rb') as f:
+        f.seek(80)
+        num_triangles = struct.unpack('<I', f.read(4))[0]
+    return num_triangles if size == 84 + num_triangles * 50 else None
+
+
+def update_manifest(conn, input_dir, max_file_size, max_triangles):
+    """add new files as pending, prefilter them by file size and header triangle count, and requeue the files of
+    an interrupted run except the ones being processed, which are marked as crashed"""
+    input_files = sorted(glob(os.path.join(input_dir, '*', '*', '*.stl')) + glob(os.path.join(input_dir, '*', '*.stl')))
+    known_files = set(row[0] for row in conn.execute('SELECT path FROM files'))
+    rows = []
+    for input_file in input_files:
+        input_file = os.path.abspath(input_file)
+        if input_file in known_files:
+            continue
+        size = os.path.getsize(input_file)
+        num_triangles = read_stl_num_triangles(input_file)
+        if size > max_file_size:
+            status = 'too_big'
+        elif num_triangles is not None and num_triangles > max_triangles:
+            status = 'too_many_triangles'
+        else:
+            status = 'pending'
+        rows.append((input_file, status, size, num_triangles, time.time()))
+    with conn:
+        conn.executemany('INSERT INTO files (path, status, size, num_triangles, updated) VALUES (?, ?, ?, ?, ?)', rows)
+        conn.execute("UPDATE files SET status = 'crashed', message = 'interrupted', updated = ? "
+                     "WHERE status = 'running' AND message = 'processing'", (time.time(),))
+        conn.execute("UPDATE files SET status = 'pending', worker = NULL WHERE status = 'running'")
+    print('Manifest: {} new files'.format(len(rows)))
+
+
+def count_status(conn):
+    return dict(conn.execute('SELECT status, COUNT(*) FROM files GROUP BY status').fetchall())
+
+
+def start_worker(args, worker_id):
+    log_file = open(os.path.join(args.output_dir, 'worker_{}.log'.format(worker_id)), 'a')
+    return subprocess.Popen([args.blender, '--background', '--python-exit-code', '1',
+                             '--python', 'examples/abc_process.py', '--',
+                             '--manifest={}'.format(args.manifest), '--output_dir={}'.format(args.output_dir),
+                             '--worker_id={}'.format(worker_id), '--max_faces={}'.format(args.max_faces),
+                             '--batch_size={}'.format(args.batch_size)],
+                            stdout=log_file, stderr=subprocess.STDOUT)
+
+
+# example: python scripts/ingest_abc.py --input_dir=resources/abc/extract --output_dir=resources/abc/models
+parser = argparse.ArgumentParser()
+parser.add_argument('--input_dir', type=str, default='resources/abc/extract',
+                    help='folder of extracted archives, example: extract/abc_xxxx_stl2_v00/<index>/<name>.stl')
+parser.add_argument('--output_dir', type=str, default='resources/abc/models')
+parser.add_argument('--manifest', type=str, default=None, help='sqlite manifest, default: <output_dir>/manifest.db')
+parser.add_argument('--num_workers', type=int, default=4, help='number of persistent blender processes')
+parser.add_argument('--batch_size', type=int, default=16, help='number of files claimed by a worker at once')
+parser.add_argument('--max_file_size', type=int, default=20000000, help='files larger than this are skipped')
+parser.add_argument('--max_triangles', type=int, default=400000,
+                    help='binary STL files with more triangles in header are skipped')
+parser.add_argument('--max_faces', type=int, default=10000, help='decimate models to this number of faces')
+parser.add_argument('--max_restarts', type=int, default=10, help='max number of restarts of crashed workers')
+parser.add_argument('--blender', type=str, default='blender')
+args = parser.parse_args()
+
+os.makedirs(args.output_dir, exist_ok=True)
+if args.manifest is None:
+    args.manifest = os.path.join(args.output_dir, 'manifest.db')
+args.manifest = os.path.abspath(args.manifest)
+
+conn = connect_manifest(args.manifest)
+update_manifest(conn, args.input_dir, args.max_file_size, args.max_triangles)
+print('Status: {}'.format(count_status(conn)))
+
+workers = {worker_id: start_worker(args, worker_id) for worker_id in range(args.num_workers)}
+restarts = 0
+while workers:
+    time.sleep(1)
+    for worker_id, worker in list(workers.items()):
+        if worker.poll() is None:
+            continue
+        del workers[worker_id]
+        if worker.returncode == 0:
+            continue
+        # the files claimed by a crashed worker are not retried, the rest of its batch is requeued
+        with conn:
+            conn.execute("UPDATE files SET status = 'crashed', message = ?, updated = ? "
+                         "WHERE status = 'running' AND worker = ? AND message = 'processing'",
+                         ('worker exit code {}'.format(worker.returncode), time.time(), worker_id))
+            conn.execute("UPDATE files SET status = 'pending', worker = NULL WHERE status = 'running' AND worker = ?",
+                         (worker_id,))
+        pending = conn.execute("SELECT COUNT(*) FROM files WHERE status = 'pending'").fetchone()[0]
+        if pending > 0 and restarts < args.max_restarts:
+            restarts += 1
+            print('Worker {} exited with code {}, restart it'.format(worker_id, worker.returncode))
+            workers[worker_id] = start_worker(args, worker_id)
+
+status = count_status(conn)
+print('Status: {}'.format(status))
+sys.exit(0 if status.get('pending', 0) == 0 and status.get('running', 0) == 0 else 1)